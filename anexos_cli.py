@@ -0,0 +1,227 @@
+# anexos_cli.py
+"""
+Generación de anexos por lotes, sin interfaz gráfica.
+
+Recibe archivos y patrones (se expanden aquí, también en Windows), procesa
+cada hoja que tenga encabezado y reparte las unidades (archivo, hoja) entre
+varios procesos. Cada archivo deja su propio árbol de salida; si se vuelve a
+correr sobre la misma salida solo se regeneran los sitios que cambiaron.
+
+    python anexos_cli.py arboles/*.xlsx -o salida -j 4
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from anexos_core import (
+    MANIFEST, SALIDAS, _header_row, new_progress, run_all_anexos, safe_name, unique_name,
+)
+from xlsx_stream import XlsxReader
+
+
+def expand_inputs(patterns):
+    """Rutas .xlsx de los archivos y patrones dados, sin repetir y en orden."""
+    paths = []
+    for pattern in patterns:
+        found = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        for path in found:
+            if os.path.basename(path).startswith("~$"):   # bloqueo de Excel
+                continue
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+
+def sheets_with_header(path):
+    """
+    Hojas de `path` en las que se encuentra la fila de encabezado. Solo se
+    busca el encabezado: si luego falta alguna columna, la hoja falla al
+    procesarse con ese error.
+    """
+    hojas = []
+    with XlsxReader(path) as book:
+        for hoja in book.sheetnames:
+            try:
+                _header_row(vals for vals, _ in book.iter_rows(hoja, max_row=20))
+            except ValueError:
+                continue
+            hojas.append(hoja)
+    return hojas
+
+
+def output_roots(paths, salida=None):
+    """
+    Carpeta de salida de cada archivo: `<salida>/Anexos_<nombre>` (por
+    defecto junto al archivo). Si dos archivos caen en la misma carpeta (el
+    mismo nombre en carpetas distintas) los siguientes llevan `_1`, `_2`...
+    según el orden de `paths`, así cada uno tiene su propio árbol.
+    """
+    roots, usados = {}, set()
+    for path in paths:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        root = os.path.join(salida or os.path.dirname(path), f"Anexos_{safe_name(stem)}")
+        roots[path] = unique_name(os.path.normcase(os.path.normpath(root)), usados)
+    return roots
+
+
+def plan_file(path, root):
+    """
+    Unidades (archivo, hoja, carpeta de salida) de un archivo que va a `root`
+    (ver `output_roots`); si tiene varias hojas con encabezado, cada una en
+    su subcarpeta.
+    Devuelve (unidades, error), con error None o el motivo de omitir el archivo.
+    """
+    try:
+        hojas = sheets_with_header(path)
+    except Exception as e:
+        return [], str(e)
+    if not hojas:
+        return [], "ninguna hoja tiene encabezado"
+    return [(path, hoja, root if len(hojas) == 1 else os.path.join(root, safe_name(hoja)))
+            for hoja in hojas], None
+
+
+def plan_units(paths, salida=None):
+    """
+    Lista de unidades de todos los archivos (ver `plan_file`), en este proceso.
+    Devuelve (unidades, errores) con los archivos que no se pudieron abrir.
+    """
+    units, errores = [], []
+    roots = output_roots(paths, salida)
+    for path in paths:
+        found, error = plan_file(path, roots[path])
+        units.extend(found)
+        if error is not None:
+            errores.append((path, None, error))
+    return units, errores
+
+
+def _omitido(path, error):
+    """Resumen de un archivo que no se pudo planificar."""
+    return {"archivo": path, "hoja": None, "salida": None, "filas": 0, "sitios": 0,
+            "segundos": 0.0, "error": error, "omitido": True}
+
+
+def run_unit(unit, workers=1, spill=None, salida="xlsx"):
+    """Procesa una unidad y devuelve su resumen (filas, sitios, segundos, error)."""
+    path, hoja, root_out = unit
+    progress = new_progress()
+    inicio   = time.perf_counter()
+    error    = None
+    try:
+        os.makedirs(root_out, exist_ok=True)
+        previa = root_out if os.path.isfile(os.path.join(root_out, MANIFEST)) else None
+        run_all_anexos(path, root_out, workers, progress, hoja, reuse_from=previa, spill=spill,
+                       salida=salida)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return {
+        "archivo":  path,
+        "hoja":     hoja,
+        "salida":   root_out,
+        "filas":    progress["filas"],
+        "sitios":   sum(progress["sitios"].values()),
+        "segundos": time.perf_counter() - inicio,
+        "error":    error,
+        "omitido":  False,
+    }
+
+
+def run_batch(units, jobs=None, workers=1, spill=None, salida="xlsx"):
+    """
+    Procesa las unidades repartidas en `jobs` procesos (None = todos los
+    núcleos, 1 = en este proceso) y produce cada resumen al terminar.
+    """
+    if jobs == 1 or len(units) < 2:
+        for unit in units:
+            yield run_unit(unit, workers, spill, salida)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(run_unit, unit, workers, spill, salida) for unit in units]
+        for future in futures:
+            yield future.result()
+
+
+def run_paths(paths, carpeta=None, jobs=None, workers=1, spill=None, salida="xlsx"):
+    """
+    Como `plan_units` + `run_batch`, pero buscando las hojas de cada archivo
+    también en el pool: cada archivo es una tarea que, al terminar, encola sus
+    hojas. Produce los resúmenes a medida que terminan; los archivos omitidos
+    llegan con "omitido" en True.
+    """
+    roots = output_roots(paths, carpeta)
+    if jobs == 1:
+        for path in paths:
+            units, error = plan_file(path, roots[path])
+            if error is not None:
+                yield _omitido(path, error)
+            for unit in units:
+                yield run_unit(unit, workers, spill, salida)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pendientes = {pool.submit(plan_file, path, roots[path]): path for path in paths}
+        while pendientes:
+            listos, _ = wait(pendientes, return_when=FIRST_COMPLETED)
+            for future in listos:
+                path = pendientes.pop(future)
+                if path is None:
+                    yield future.result()
+                    continue
+                units, error = future.result()
+                if error is not None:
+                    yield _omitido(path, error)
+                for unit in units:
+                    pendientes[pool.submit(run_unit, unit, workers, spill, salida)] = None
+
+
+def print_summary(resumenes, total, out=sys.stdout):
+    """Tabla con el tiempo, filas y sitios de cada unidad."""
+    print(f"\n{'seg':>8} {'filas':>9} {'sitios':>7}  archivo [hoja]", file=out)
+    for r in resumenes:
+        estado = f"  ERROR {r['error']}" if r["error"] else ""
+        print(f"{r['segundos']:8.2f} {r['filas']:9d} {r['sitios']:7d}  "
+              f"{r['archivo']} [{r['hoja']}]{estado}", file=out)
+    filas = sum(r["filas"] for r in resumenes)
+    print(f"{total:8.2f} {filas:9d} {sum(r['sitios'] for r in resumenes):7d}  "
+          f"total ({len(resumenes)} hoja{'' if len(resumenes) == 1 else 's'})", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera los anexos de varios Árboles de Equipos.")
+    parser.add_argument("archivos", nargs="+", help="archivos .xlsx o patrones (p. ej. 'datos/*.xlsx')")
+    parser.add_argument("-o", "--salida", help="carpeta donde dejar los resultados "
+                                               "(por defecto junto a cada archivo)")
+    parser.add_argument("-j", "--jobs", type=int, default=0,
+                        help="hojas que se procesan a la vez (0 = todos los núcleos)")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="procesos que escriben los sitios de cada hoja (0 = todos los núcleos)")
+    parser.add_argument("--spill", action="store_true", default=None,
+                        help="guardar las filas clasificadas en disco (memoria acotada)")
+    parser.add_argument("--salida-formato", dest="formato", choices=SALIDAS, default="xlsx",
+                        help="xlsx con formato, archivos de carga SAP por sitio (carga) "
+                             "o uno por anexo con columna Sitio (carga_unica)")
+    args = parser.parse_args(argv)
+
+    paths = expand_inputs(args.archivos)
+    if not paths:
+        parser.error("no se encontró ningún archivo")
+    inicio = time.perf_counter()
+    resumenes, omitidos = [], 0
+    for r in run_paths(paths, args.salida, args.jobs or None, args.workers,
+                       args.spill, args.formato):
+        if r["omitido"]:
+            print(f"Se omite {r['archivo']}: {r['error']}", file=sys.stderr)
+            omitidos += 1
+            continue
+        print(f"{'ERROR' if r['error'] else 'ok':>5} {r['archivo']} [{r['hoja']}] → {r['salida']}",
+              file=sys.stderr)
+        resumenes.append(r)
+    print_summary(resumenes, time.perf_counter() - inicio)
+    return 1 if omitidos or any(r["error"] for r in resumenes) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,891 @@
+# anexos_core.py
+"""
+Motor de generación de anexos, sin interfaz gráfica.
+xlsxwriter se importa recién al escribir los archivos, para que importar
+este módulo (y arrancar el servidor) sea barato.
+"""
+import datetime
+import hashlib
+import io
+import json
+import os
+import pickle
+import shutil
+import unicodedata
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+from itertools import islice
+from operator import itemgetter
+
+from anexos_specs import GREEN, YELLOW, RED, SITIO, SPECS, SPEC_BY_NUM  # noqa: F401
+from metrics import METRICAS, REPORT, fase, report_bytes, timed
+from record_store import AnexoEnDisco, SpillStore
+from style_palette import StylePalette, palette_from_openpyxl
+from xlsx_stream import XlsxReader
+from zip_stream import iter_zip
+
+# Cambia cuando cambia el contenido de los archivos generados (invalida la caché)
+GENERATOR_VERSION = "7"
+
+# Carpeta de salida y número de cada anexo, en el orden en que se generan
+ANEXOS = [(spec["carpeta"], spec["num"]) for spec in SPECS]
+
+def run_all_anexos(file_path, root_out, workers=1, progress=None, hoja=None, reuse_from=None,
+                   spill=None, anexos=None, sitios=None, salida="xlsx"):
+    """
+    Ejecuta los cinco anexos sobre `file_path` y va dejando los resultados
+    en subcarpetas dentro de `root_out`. `workers` es el número de procesos
+    que escriben los archivos por sitio (None = todos los núcleos).
+    Si se pasa `progress` (ver `new_progress`) se va actualizando en el camino.
+    `hoja` elige la hoja a procesar (por defecto la primera).
+    `reuse_from` es una carpeta de una ejecución anterior: los archivos de los
+    sitios que no cambiaron se copian de allí en vez de regenerarse.
+    Deja en `root_out` el informe de la ejecución (`metrics.REPORT`).
+    Con `spill` (por defecto ANEXOS_SPILL=1) las filas clasificadas se guardan
+    en disco y se leen de a un sitio (ver `record_store`).
+    `anexos` (números) y `sitios` (valores de Campo de clasificación) limitan
+    la generación a esos anexos y sitios; por defecto, todos.
+    `salida` elige qué se escribe (ver `SALIDAS`): los .xlsx con formato o
+    los archivos planos de carga masiva.
+    """
+    progress = progress if progress is not None else new_progress()
+    store    = new_store(spill)
+    try:
+        tasks = classify_file(file_path, hoja, progress, store, anexos, sitios, salida)
+        render_all(tasks, root_out, workers, progress, reuse_from, anexos, sitios)
+    except Exception as e:
+        METRICAS.registrar_ejecucion(progress, error=e)
+        raise
+    finally:
+        if store is not None:
+            store.close()
+    write_report(root_out, progress)
+    METRICAS.registrar_ejecucion(progress)
+
+def zip_anexos(source, workers=1, progress=None, hoja=None, spill=None, anexos=None, sitios=None,
+               salida="xlsx", directorio=None):
+    """
+    Variante sin disco de `run_all_anexos`: clasifica `source` (ruta o archivo
+    binario) y devuelve un iterador con los bytes del ZIP de todos los anexos,
+    que se van produciendo a medida que se escribe cada .xlsx.
+    La clasificación ocurre aquí mismo, así los errores de la hoja saltan antes
+    de empezar a enviar el ZIP. `spill`, `anexos`, `sitios` y `salida` como
+    en `run_all_anexos`; `directorio` es dónde va el archivo de `spill`.
+    """
+    progress = progress if progress is not None else new_progress()
+    store    = new_store(spill, directorio)
+    try:
+        tasks = classify_file(source, hoja, progress, store, anexos, sitios, salida)
+    except Exception as e:
+        if store is not None:
+            store.close()
+        METRICAS.registrar_ejecucion(progress, error=e)
+        raise
+    entries = timed(iter_rendered(tasks, workers, progress), progress, "escribir")
+    return _registrar(iter_zip(_with_manifest(tasks, entries, progress), progress), progress, store)
+
+def _with_manifest(tasks, entries, progress):
+    """Agrega al final de las entradas del ZIP el archivo de huellas y el informe."""
+    yield from entries
+    yield MANIFEST, manifest_bytes({f"{t[3]}/{t[4]}": fingerprint(t) for t in tasks},
+                                   {f"{t[3]}/{t[4]}": t[1] for t in tasks})
+    yield REPORT, report_bytes(progress, GENERATOR_VERSION)
+
+def _registrar(chunks, progress, store=None):
+    """
+    Pasa los bytes del ZIP y, al terminar, suma la ejecución a las métricas
+    y cierra el almacén en disco (si lo hay).
+    """
+    try:
+        yield from chunks
+    except Exception as e:
+        METRICAS.registrar_ejecucion(progress, error=e)
+        raise
+    finally:
+        if store is not None:
+            store.close()
+    METRICAS.registrar_ejecucion(progress)
+
+def spill_activo(spill=None):
+    """Si se clasifica a disco: `spill`, o por defecto ANEXOS_SPILL=1."""
+    return os.environ.get("ANEXOS_SPILL") == "1" if spill is None else bool(spill)
+
+def new_store(spill=None, directorio=None):
+    """
+    `SpillStore` temporal si hay que clasificar a disco (`spill`, o por
+    defecto ANEXOS_SPILL=1), o None. El archivo va en `directorio` (por
+    defecto ANEXOS_SPILL_DIR).
+    """
+    if not spill_activo(spill):
+        return None
+    return SpillStore(directorio=directorio or os.environ.get("ANEXOS_SPILL_DIR"))
+
+def new_progress():
+    """
+    Contadores de avance de una ejecución: filas recorridas; por anexo, filas
+    que entraron, sitios escritos y sitios a escribir; segundos y pico de
+    memoria por fase (ver `metrics.fase`) y bytes de .xlsx producidos.
+    `cache` indica que el resultado salió de la caché (ver `result_cache`).
+    """
+    return {
+        "filas":        0,
+        "registros":    {num: 0 for _, num in ANEXOS},
+        "sitios":       {num: 0 for _, num in ANEXOS},
+        "sitios_total": {num: 0 for _, num in ANEXOS},
+        "fases":        {},
+        "memoria_pico": {},
+        "bytes":        0,
+        "cache":        False,
+    }
+
+def classify_file(source, hoja=None, progress=None, store=None, anexos=None, sitios=None,
+                  salida="xlsx"):
+    """
+    Lee `source` en streaming y devuelve los trabajos de escritura (ver
+    `plan_tasks`). Con `store` (`SpillStore`) las filas van a disco.
+    `anexos` y `sitios` limitan qué se genera (ver `scan_rows`).
+    """
+    check_salida(salida)
+    with XlsxReader(source) as book:
+        # puedes adaptar aquí la lógica de elegir hoja si quieres
+        hoja = hoja or book.sheetnames[0]
+        with fase(progress, "encabezado"):
+            norm_hdr, rows = open_sheet(book, hoja, anexos)
+        with fase(progress, "clasificar"):
+            registros = scan_rows(rows, norm_hdr, anexos, progress, book.palette, store, sitios)
+    with fase(progress, "tablas"):
+        tasks = plan_tasks(registros, salida)
+    if progress is not None:
+        for num, filas in registros.items():
+            progress["registros"][num] += len(filas)
+        for task in tasks:
+            progress["sitios_total"][task[0]] += 1
+    return tasks
+
+def open_sheet(book, hoja, anexos=None):
+    """
+    Localiza el encabezado de `hoja` en un `XlsxReader` y devuelve
+    (encabezado normalizado, iterador en streaming de las filas de datos).
+    Las filas solo traen las columnas que usan los `anexos` pedidos (por
+    defecto todos); si falta alguna obligatoria se lanza ValueError aquí.
+    """
+    header_row = _header_row(vals for vals, _ in book.iter_rows(hoja, max_row=20))
+    raw_hdr, _ = next(book.iter_rows(hoja, min_row=header_row, max_row=header_row))
+    norm_hdr = [normalize(h) for h in raw_hdr]
+    columns  = columnas_usadas(norm_hdr, anexos)
+    return norm_hdr, book.iter_rows(hoja, min_row=header_row+1, width=len(norm_hdr),
+                                    columns=columns)
+
+def generate_all(rows, norm_hdr, root_out, workers=1, palette=None):
+    """
+    Clasifica las filas en una sola pasada y escribe cada anexo en su
+    subcarpeta, repartiendo los archivos por sitio entre `workers` procesos.
+    """
+    render_all(plan_tasks(scan_rows(rows, norm_hdr, palette=palette)), root_out, workers)
+
+def normalize(text):
+    """Convierte a mayúsculas sin tildes ni marcas diacríticas."""
+    if text is None:
+        return ""
+    s = unicodedata.normalize("NFD", str(text).upper())
+    return "".join(ch for ch in s if unicodedata.category(ch) != "Mn")
+
+def find_col(norm_headers, *keywords):
+    """Devuelve el índice de la primera columna cuyo header contenga todas las keywords."""
+    for i, nh in enumerate(norm_headers):
+        if all(k in nh for k in keywords):
+            return i
+    raise ValueError(f"No encontré columna con {' & '.join(keywords)}")
+
+def get_unique_filename(path):
+    """Si el archivo existe, añade _1, _2, ... antes de la extensión."""
+    base, ext = os.path.splitext(path)
+    i = 1
+    new = path
+    while os.path.exists(new):
+        new = f"{base}_{i}{ext}"
+        i += 1
+    return new
+
+def get_unique_foldername(path):
+    """Si la carpeta existe, añade _1, _2, ... al final."""
+    i = 1
+    new = path
+    while os.path.exists(new):
+        new = f"{path}_{i}"
+        i += 1
+    return new
+
+def detect_header(ws):
+    """Encuentra la fila que contiene DENOMINACION y NIVEL8."""
+    return _header_row([c.value for c in ws[r]] for r in range(1, 21))
+
+def _header_row(rows):
+    """Número (desde 1) de la primera fila de valores que tenga DENOMINACION y NIVEL8."""
+    for r, vals in enumerate(rows, start=1):
+        vals = [normalize(v) for v in vals]
+        if "DENOMINACION" in vals and "NIVEL8" in vals:
+            return r
+    raise ValueError("No encontré fila de encabezado (buscando DENOMINACION y NIVEL8).")
+
+def resolve_campos(norm_hdr, campos, opcionales=False):
+    """
+    Traduce un dict {columna de salida: keywords} a {columna de salida: índice}.
+    Con `opcionales` las columnas que no aparezcan se omiten en vez de fallar.
+    Las claves sin keywords (None) se dejan en None para rellenarlas aparte.
+    """
+    col_idx = {}
+    for out, keys in campos.items():
+        if keys is None:
+            col_idx[out] = None
+            continue
+        try:
+            col_idx[out] = find_col(norm_hdr, *keys)
+        except ValueError:
+            if not opcionales:
+                raise
+    return col_idx
+
+class _StyleIds:
+    """Ids de estilo de una fila de openpyxl, resueltos solo si algún filtro los pide."""
+    __slots__ = ("row",)
+
+    def __init__(self, row):
+        self.row = row
+
+    def __getitem__(self, i):
+        return self.row[i].style_id
+
+def iter_ws_rows(ws, min_row):
+    """Adapta las filas de una hoja openpyxl al formato (valores, ids de estilo)."""
+    for row in ws.iter_rows(min_row=min_row, max_row=ws.max_row, values_only=False):
+        yield [c.value for c in row], _StyleIds(row)
+
+def scan_anexos(ws, header_row, norm_hdr, anexos=None):
+    """Clasifica una hoja openpyxl ya cargada (ver `scan_rows`)."""
+    return scan_rows(iter_ws_rows(ws, header_row+1), norm_hdr, anexos,
+                     palette=palette_from_openpyxl(ws.parent))
+
+# ── filtros de los specs ────────────────────────────────────────────────
+# Cada tipo de filtro se compila contra el encabezado y devuelve (columnas que
+# lee, función que dada la paleta del libro (`StylePalette`) arma el filtro
+# (valores, ids de estilo) → None si la fila no entra, o el valor que ocupa
+# los campos None del spec). Los colores se comparan una vez por estilo, no
+# por celda: cada filtro de color queda en un `in` sobre un conjunto de ids.
+
+def _filtro_texto(norm_hdr, keys, texto):
+    """Celda de texto igual a `texto` (sin importar mayúsculas ni espacios)."""
+    col = find_col(norm_hdr, *keys)
+    def match(values, styles):
+        val = values[col]
+        if isinstance(val, str) and val.strip().upper() == texto:
+            return val
+    return (col,), lambda palette: match
+
+def _filtro_fuente(norm_hdr, keys, rgb, modo):
+    col = find_col(norm_hdr, *keys)
+    def bind(palette):
+        ids = palette.font_ids(modo, rgb)
+        def match(values, styles):
+            if styles[col] in ids:
+                return values[col]
+        return match
+    return (col,), bind
+
+def _filtro_fuente_contiene(norm_hdr, keys, rgb):
+    """Fuente cuyo ARGB contiene `rgb`."""
+    return _filtro_fuente(norm_hdr, keys, rgb, "contiene")
+
+def _filtro_fuente_termina(norm_hdr, keys, rgb):
+    """Fuente cuyo ARGB termina en `rgb` (se ignora el canal alfa)."""
+    return _filtro_fuente(norm_hdr, keys, rgb, "termina")
+
+def _filtro_color_en(norm_hdr, keys_list, rgb):
+    """Primera celda no vacía de las columnas dadas con fuente o relleno `rgb`."""
+    cols = tuple(find_col(norm_hdr, *keys) for keys in keys_list)
+    def bind(palette):
+        ids = palette.font_ids("contiene", rgb) | palette.fill_ids("contiene", rgb)
+        def match(values, styles):
+            for col in cols:
+                val = values[col]
+                if not val: continue
+                if styles[col] in ids:
+                    return val
+        return match
+    return cols, bind
+
+FILTROS = {
+    "texto":           _filtro_texto,
+    "fuente_contiene": _filtro_fuente_contiene,
+    "fuente_termina":  _filtro_fuente_termina,
+    "color_en":        _filtro_color_en,
+}
+
+class Registros(list):
+    """Filas (tuplas) que entraron a un anexo, con los nombres de sus columnas."""
+    __slots__ = ("columnas",)
+
+    def __init__(self, columnas, filas=()):
+        super().__init__(filas)
+        self.columnas = columnas
+
+    def __reduce__(self):
+        return (Registros, (self.columnas, list(self)))
+
+class TablaUnida:
+    """
+    Las tablas por sitio de un anexo una tras otra, para el archivo de carga
+    único. Las tablas traen su columna de grupo (ver `site_tables`).
+    """
+
+    def __init__(self, tablas):
+        self.tablas   = tablas   # [(sitio, tabla)] en orden de sitio
+        self.columnas = tablas[0][1].columnas
+
+    def __iter__(self):
+        for _, tabla in self.tablas:
+            yield from tabla
+
+def _projector(idxs):
+    """Función (valores, match) → tupla con las columnas del anexo."""
+    if None in idxs:
+        return lambda values, m: tuple(m if i is None else values[i] for i in idxs)
+    if len(idxs) == 1:
+        i = idxs[0]
+        return lambda values, m: (values[i],)
+    getter = itemgetter(*idxs)
+    return lambda values, m: getter(values)
+
+@lru_cache(maxsize=64)
+def compile_plan(header, nums):
+    """
+    Compila los specs `nums` contra un encabezado normalizado (tupla) y
+    devuelve una tupla de (num, columnas, filtro sin paleta, proyección,
+    índices de las columnas que lee). El resultado queda en caché: los libros
+    con el mismo encabezado no repiten las búsquedas de columnas.
+    """
+    norm_hdr = list(header)
+    plan = []
+    for num in nums:
+        spec    = SPEC_BY_NUM[num]
+        col_idx = resolve_campos(norm_hdr, spec["campos"], spec.get("opcionales", False))
+        tipo, *args = spec["filtro"]
+        leidas, bind = FILTROS[tipo](norm_hdr, *args)
+        usadas  = {i for i in col_idx.values() if i is not None} | set(leidas)
+        plan.append((num, tuple(col_idx), bind, _projector(tuple(col_idx.values())),
+                     tuple(sorted(usadas))))
+    return tuple(plan)
+
+def anexo_nums(anexos=None):
+    """Números de anexo pedidos, validados y en orden (por defecto todos)."""
+    if anexos is None:
+        return tuple(SPEC_BY_NUM)
+    nums = {int(num) for num in anexos}
+    desconocidos = nums - SPEC_BY_NUM.keys()
+    if desconocidos:
+        raise ValueError(f"Anexo desconocido: {', '.join(map(str, sorted(desconocidos)))}")
+    return tuple(sorted(nums))
+
+def columnas_usadas(norm_hdr, anexos=None):
+    """
+    Índices de las columnas que necesitan los anexos pedidos (más la del
+    sitio): el resto de la hoja no hace falta leerlo.
+    """
+    usadas = set()
+    for plan in compile_plan(tuple(norm_hdr), anexo_nums(anexos)):
+        usadas.update(plan[4])
+    try:
+        usadas.add(find_col(norm_hdr, *SITIO))
+    except ValueError:
+        pass
+    return frozenset(usadas)
+
+def scan_rows(rows, norm_hdr, anexos=None, progress=None, palette=None, store=None, sitios=None):
+    """
+    Recorre las filas una sola vez y clasifica cada una para todos los anexos
+    pedidos (por defecto todos los de SPECS) según el filtro de cada spec.
+    `rows` produce tuplas (valores, ids de estilo) por columna, y `palette`
+    (`StylePalette`) da los colores de cada id; sin paleta ninguna celda
+    tiene color. Devuelve {número de anexo: Registros}, o con `store`
+    (`SpillStore`) {número de anexo: AnexoEnDisco} con las filas en disco.
+    `sitios` limita las filas a esos valores de Campo de clasificación (sin
+    importar mayúsculas ni tildes).
+    Con `progress` se actualiza progress["filas"] cada mil filas.
+    """
+    plan = compile_plan(tuple(norm_hdr), anexo_nums(anexos))
+    palette = palette or StylePalette([], [])
+    if store is None:
+        out = {num: Registros(columnas) for num, columnas, *_ in plan}
+    else:
+        out = {num: store.anexo(num, columnas, SPEC_BY_NUM[num]["grupo"])
+               for num, columnas, *_ in plan}
+    active = [(bind(palette), project, out[num].append) for num, _, bind, project, _ in plan]
+    if sitios is not None:
+        sitios    = {normalize(sitio).strip() for sitio in sitios}
+        col_sitio = find_col(norm_hdr, *SITIO)
+
+    n = 0
+    for n, (values, styles) in enumerate(rows, start=1):
+        if progress is not None and not n % 1000:
+            progress["filas"] = n
+        if sitios is not None and normalize(values[col_sitio]).strip() not in sitios:
+            continue
+        for match, project, append in active:
+            m = match(values, styles)
+            if m is not None:
+                append(project(values, m))
+    if progress is not None:
+        progress["filas"] = n
+    if store is not None:
+        store.commit()
+    return out
+
+def generate_anexo8(ws, header_row, norm_hdr, out_dir):
+    """Anexo 8: pendientes de QR (filtra 'NO QR' en NIVEL7)."""
+    write_anexo(8, scan_anexos(ws, header_row, norm_hdr, (8,))[8], out_dir)
+
+def generate_anexo9(ws, header_row, norm_hdr, out_dir):
+    """Anexo 9: incorporación SAP (texto verde puro en NIVEL8)."""
+    write_anexo(9, scan_anexos(ws, header_row, norm_hdr, (9,))[9], out_dir)
+
+def generate_anexo10(ws, header_row, norm_hdr, out_dir):
+    """Anexo 10: equipos modificados (texto amarillo puro en NIVEL8)."""
+    write_anexo(10, scan_anexos(ws, header_row, norm_hdr, (10,))[10], out_dir)
+
+def generate_anexo11(ws, header_row, norm_hdr, out_dir):
+    """Anexo 11: desincorporaciones (texto rojo puro en NIVEL8)."""
+    write_anexo(11, scan_anexos(ws, header_row, norm_hdr, (11,))[11], out_dir)
+
+def generate_anexo12(ws, header_row, norm_hdr, out_dir):
+    """Anexo 12: ubicaciones técnicas creadas (verde en NIVEL5–7)."""
+    write_anexo(12, scan_anexos(ws, header_row, norm_hdr, (12,))[12], out_dir)
+
+def _orden_sitios(sitios):
+    try:
+        return sorted(sitios)
+    except TypeError:   # sitios de tipos mezclados (texto y números)
+        return sorted(sitios, key=lambda s: (type(s).__name__, s))
+
+def site_tables(num, registros, quitar_grupo=None):
+    """
+    Arma la tabla del anexo `num` y la separa por sitio según su spec.
+    Produce (sitio, Registros) en orden de sitio; las filas sin sitio se omiten.
+    Si las filas están en disco (`AnexoEnDisco`) cada tabla se lee recién al
+    escribirla. `quitar_grupo` (por defecto el del spec) decide si la columna
+    de grupo sale de la tabla.
+    """
+    spec     = SPEC_BY_NUM[num]
+    quitar   = spec["quitar_grupo"] if quitar_grupo is None else quitar_grupo
+    if isinstance(registros, AnexoEnDisco):
+        for sitio in _orden_sitios(registros.store.sitios(num)):
+            yield sitio, registros.tabla(sitio, spec.get("numerar"), quitar)
+        return
+    columnas = list(registros.columnas)
+    filas    = registros
+    if spec.get("numerar"):
+        columnas.insert(0, spec["numerar"])
+        filas = [(i, *fila) for i, fila in enumerate(registros, start=1)]
+
+    key = columnas.index(spec["grupo"])
+    grupos = {}
+    for fila in filas:
+        sitio = fila[key]
+        if sitio is None or sitio != sitio:   # vacío o NaN
+            continue
+        grupos.setdefault(sitio, []).append(fila)
+
+    if quitar:
+        del columnas[key]
+    columnas = tuple(columnas)
+    for sitio in _orden_sitios(grupos):
+        filas = grupos[sitio]
+        if quitar:
+            filas = [fila[:key] + fila[key+1:] for fila in filas]
+        yield sitio, Registros(columnas, filas)
+
+def safe_name(sitio):
+    """Nombre de archivo seguro para un sitio."""
+    return "".join(c if c.isalnum() or c in " _-" else "_" for c in str(sitio))
+
+def site_filename(hoja, sitio):
+    """
+    Nombre (sin extensión) del archivo de un sitio. Solo depende del sitio:
+    si `safe_name` tuvo que cambiarlo se agrega un resumen corto del valor
+    original, así "A/B" y "A_B" no comparten archivo aunque se generen en
+    ejecuciones distintas.
+    """
+    name = safe_name(sitio)
+    if name != str(sitio):
+        name += "_" + hashlib.sha1(str(sitio).encode("utf-8")).hexdigest()[:6]
+    return f"{hoja}_{name}"
+
+def unique_name(name, usados):
+    """
+    Como `get_unique_filename` pero sobre el conjunto `usados` en lugar del
+    disco, así el nombre solo depende del orden de los sitios.
+    """
+    i = 1
+    new = name
+    while new in usados:
+        new = f"{name}_{i}"
+        i += 1
+    usados.add(new)
+    return new
+
+# Formatos de salida: .xlsx con formato por sitio, archivo plano de carga por
+# sitio, o un solo archivo de carga por anexo con la columna Sitio
+SALIDAS = ("xlsx", "carga", "carga_unica")
+EXT_CARGA = ".txt"
+
+def check_salida(salida):
+    """Devuelve `salida` (por defecto "xlsx") o lanza ValueError si no existe."""
+    salida = salida or "xlsx"
+    if salida not in SALIDAS:
+        raise ValueError(f"Salida desconocida: {salida} (opciones: {', '.join(SALIDAS)})")
+    return salida
+
+def plan_tasks(registros, salida="xlsx"):
+    """
+    Devuelve la lista de trabajos (anexo, sitio, tabla, subcarpeta, archivo)
+    a escribir, con nombres de archivo deterministas. La extensión del
+    archivo decide cómo se escribe (ver `ESCRITORES`); con "carga_unica" hay
+    un solo trabajo por anexo, con sitio None y una `TablaUnida`.
+    Las tablas de los archivos de carga conservan la columna de grupo: la
+    elige (o no) la lista `carga` del spec.
+    """
+    salida = check_salida(salida)
+    quitar = None if salida == "xlsx" else False
+    tasks = []
+    for spec in SPECS:
+        num = spec["num"]
+        if not registros.get(num):
+            continue
+        if salida == "carga_unica":
+            tablas = list(site_tables(num, registros[num], quitar))
+            if tablas:
+                tasks.append((num, None, TablaUnida(tablas), spec["carpeta"],
+                              spec["hoja"] + EXT_CARGA))
+            continue
+        ext = ".xlsx" if salida == "xlsx" else EXT_CARGA
+        usados = set()
+        for sitio, tabla in site_tables(num, registros[num], quitar):
+            name = unique_name(site_filename(spec["hoja"], sitio), usados)
+            tasks.append((num, sitio, tabla, spec["carpeta"], name + ext))
+    return tasks
+
+def _escritor(filename):
+    return ESCRITORES[os.path.splitext(filename)[1]]
+
+def render_task(task, root_out):
+    """Escribe el archivo de un trabajo dentro de `root_out` y devuelve la ruta."""
+    num, sitio, tabla, subdir_name, filename = task
+    path = os.path.join(root_out, subdir_name, filename)
+    _escritor(filename)(tabla, path, num, sitio)
+    return path
+
+def render_bytes(task):
+    """Escribe el archivo de un trabajo en memoria → (nombre dentro del zip, bytes)."""
+    num, sitio, tabla, subdir_name, filename = task
+    buf = io.BytesIO()
+    _escritor(filename)(tabla, buf, num, sitio)
+    return f"{subdir_name}/{filename}", buf.getvalue()
+
+def _pool_map(func, tasks, workers):
+    """
+    Aplica `func` a cada trabajo, en orden y de forma perezosa. Con `workers`
+    > 1 (o None o 0 = todos los núcleos) se reparten en un pool de procesos; con 1
+    se ejecutan en este proceso.
+    """
+    workers = workers or None   # 0 = todos los núcleos, como None
+    if workers == 1 or len(tasks) < 2:
+        yield from map(func, tasks)
+        return
+    # Solo hay `ventana` trabajos encolados o terminados sin entregar: si el
+    # consumidor (el cliente del ZIP) va más lento, los procesos esperan en
+    # vez de acumular bytes aquí. Si se abandona el generador, lo que no
+    # empezó se cancela.
+    n = workers or os.cpu_count() or 1
+    ventana = 2 * n
+    pendientes = deque()
+    restantes = iter(tasks)
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        for task in islice(restantes, ventana):
+            pendientes.append(pool.submit(func, task))
+        while pendientes:
+            result = pendientes.popleft().result()
+            for task in islice(restantes, 1):
+                pendientes.append(pool.submit(func, task))
+            yield result
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def _count_sites(tasks, results, progress):
+    """Pasa los resultados tal cual, sumando en `progress` cada sitio escrito."""
+    for task, result in zip(tasks, results):
+        if progress is not None:
+            progress["sitios"][task[0]] += 1
+        yield result
+
+MANIFEST = ".anexos_manifest.json"
+
+def fingerprint(task):
+    """Huella de la tabla de un trabajo: si no cambia, el .xlsx sería idéntico."""
+    num, sitio, tabla, subdir_name, filename = task
+    h = hashlib.sha256()
+    h.update(f"{GENERATOR_VERSION}\0{num}\0{sitio}\0{filename}\0".encode("utf-8"))
+    # Fila a fila: la tabla puede estar en disco y no tiene por qué caber en memoria
+    h.update(pickle.dumps(tuple(tabla.columnas), protocol=4))
+    for fila in tabla:
+        h.update(pickle.dumps(fila, protocol=4))
+    return h.hexdigest()
+
+def _manifest_data(root):
+    try:
+        with open(os.path.join(root, MANIFEST), encoding="utf-8") as fh:
+            data = json.load(fh)
+    except (FileNotFoundError, ValueError):
+        return {}
+    return data if data.get("version") == GENERATOR_VERSION else {}
+
+def read_manifest(root):
+    """Huellas {"subcarpeta/archivo": huella} de la ejecución guardada en `root`."""
+    return _manifest_data(root).get("archivos", {})
+
+def read_manifest_sitios(root):
+    """Sitio de cada archivo {"subcarpeta/archivo": sitio} (None = archivo de todo el anexo)."""
+    return _manifest_data(root).get("sitios", {})
+
+def manifest_bytes(archivos, sitios=None):
+    data = {"version": GENERATOR_VERSION, "archivos": archivos}
+    if sitios is not None:
+        data["sitios"] = {rel: None if s is None else str(s) for rel, s in sitios.items()}
+    return json.dumps(data, ensure_ascii=False, indent=1).encode("utf-8")
+
+def write_manifest(root, archivos, sitios=None):
+    with open(os.path.join(root, MANIFEST), "wb") as fh:
+        fh.write(manifest_bytes(archivos, sitios))
+
+def render_all(tasks, root_out, workers=1, progress=None, reuse_from=None,
+               anexos=None, sitios=None):
+    """
+    Crea las subcarpetas de los anexos y escribe todos los trabajos en disco,
+    dejando en `root_out` la huella de cada archivo.
+    Con `reuse_from` (carpeta de una ejecución anterior, puede ser la misma
+    `root_out`) solo se vuelven a escribir los sitios cuya huella cambió; los
+    demás se copian de allí tal cual.
+    `anexos` y `sitios` son la selección con que se clasificó (ver
+    `run_all_anexos`): los archivos anteriores fuera de ella se conservan.
+    """
+    for subdir_name, _ in ANEXOS:
+        os.makedirs(os.path.join(root_out, subdir_name), exist_ok=True)
+
+    with fase(progress, "escribir"):
+        archivos = _render_changed(tasks, root_out, workers, progress, reuse_from, anexos, sitios)
+    if progress is not None:
+        progress["bytes"] += sum(os.path.getsize(os.path.join(root_out, *rel.split("/")))
+                                 for rel in archivos)
+    return [os.path.join(root_out, *rel.split("/")) for rel in archivos]
+
+def _en_seleccion(rel, sitio, anexos, sitios):
+    """
+    True si el archivo `rel` (del sitio `sitio`) lo habría producido una
+    ejecución con esta selección. Sin el sitio (manifiestos antiguos) solo
+    cuenta el anexo si no se eligieron sitios.
+    """
+    carpeta = rel.split("/", 1)[0]
+    if anexos is not None and carpeta not in {SPEC_BY_NUM[n]["carpeta"] for n in anexo_nums(anexos)}:
+        return False
+    if sitios is None:
+        return True
+    if sitio is None:
+        return False
+    return normalize(sitio).strip() in {normalize(s).strip() for s in sitios}
+
+def _render_changed(tasks, root_out, workers, progress, reuse_from, anexos=None, sitios=None):
+    """Cuerpo de `render_all`; devuelve las huellas escritas en el manifiesto."""
+    previous    = read_manifest(reuse_from) if reuse_from else {}
+    prev_sitios = read_manifest_sitios(reuse_from) if reuse_from else {}
+    archivos    = {}
+    sitio_de    = {}
+    todo        = []
+    for task in tasks:
+        rel = f"{task[3]}/{task[4]}"
+        anterior = prev_sitios.get(rel)
+        if anterior is not None and not _en_seleccion(rel, anterior, anexos, sitios):
+            raise ValueError(f"{rel} es de {anterior}, fuera de la selección: "
+                             f"no se sobrescribe.")
+        archivos[rel] = fp = fingerprint(task)
+        sitio_de[rel] = task[1]
+        src = os.path.join(reuse_from, task[3], task[4]) if reuse_from else None
+        if previous.get(rel) == fp and os.path.exists(src):
+            dst = os.path.join(root_out, task[3], task[4])
+            if not os.path.exists(dst) or not os.path.samefile(src, dst):
+                shutil.copy2(src, dst)
+            if progress is not None:
+                progress["sitios"][task[0]] += 1
+        else:
+            todo.append(task)
+
+    results = _pool_map(partial(render_task, root_out=root_out), todo, workers)
+    for _ in _count_sites(todo, results, progress):
+        pass
+
+    # Lo anterior que quedó fuera de la selección sigue siendo válido: pasa
+    # tal cual al manifiesto (y a `root_out`, si es otra carpeta)
+    misma = reuse_from and os.path.abspath(reuse_from) == os.path.abspath(root_out)
+    for rel in previous.keys() - archivos.keys():
+        if _en_seleccion(rel, prev_sitios.get(rel), anexos, sitios):
+            continue
+        src = os.path.join(reuse_from, *rel.split("/"))
+        if not os.path.exists(src):
+            continue
+        if not misma:
+            shutil.copy2(src, os.path.join(root_out, *rel.split("/")))
+        archivos[rel] = previous[rel]
+        sitio_de[rel] = prev_sitios.get(rel)
+
+    # Al regenerar sobre la misma carpeta, los sitios de la selección que ya
+    # no existen sobran
+    if misma:
+        for rel in previous.keys() - archivos.keys():
+            path = os.path.join(root_out, *rel.split("/"))
+            if os.path.exists(path):
+                os.remove(path)
+    write_manifest(root_out, archivos, sitio_de)
+    return archivos
+
+def write_report(root, progress):
+    """Guarda en `root` el informe de la ejecución (`metrics.REPORT`)."""
+    with open(os.path.join(root, REPORT), "wb") as fh:
+        fh.write(report_bytes(progress, GENERATOR_VERSION))
+
+def iter_tree(root_out):
+    """(nombre dentro del zip, bytes) de cada archivo de una ejecución en disco."""
+    rels = [*read_manifest(root_out), MANIFEST]
+    if os.path.exists(os.path.join(root_out, REPORT)):
+        rels.append(REPORT)
+    for rel in rels:
+        with open(os.path.join(root_out, *rel.split("/")), "rb") as fh:
+            yield rel, fh.read()
+
+def latest_run(base):
+    """La carpeta `base`, `base_1`, ... más reciente que tenga huellas guardadas, o None."""
+    parent, name = os.path.split(base)
+    candidatos = []
+    for entry in os.listdir(parent or "."):
+        path = os.path.join(parent, entry)
+        if (entry == name or entry.startswith(name + "_")) and os.path.isfile(os.path.join(path, MANIFEST)):
+            candidatos.append((os.path.getmtime(os.path.join(path, MANIFEST)), path))
+    return max(candidatos)[1] if candidatos else None
+
+def iter_rendered(tasks, workers=1, progress=None):
+    """Produce (nombre dentro del zip, bytes) de cada trabajo a medida que se escriben."""
+    for entry in _count_sites(tasks, _pool_map(render_bytes, tasks, workers), progress):
+        if progress is not None:
+            progress["bytes"] += len(entry[1])
+        yield entry
+
+# Formatos de los anexos; se crean una sola vez por libro
+FORMATOS = {
+    "titulo":    {"bold":True,"font_size":16,"align":"center","valign":"vcenter"},
+    "subtitulo": {"bold":True,"font_size":12,"align":"center","valign":"vcenter"},
+    "hdr":       {"bold":True,"font_color":"#FFFFFF","bg_color":"#305496","border":1,"align":"center","valign":"vcenter"},
+    "celda":     {"border":1,"valign":"vcenter"},
+}
+FORMATO_FECHA = "YYYY-MM-DD HH:MM:SS"
+
+def write_site_xlsx(tabla, target, num, sitio):
+    """
+    Escribe la tabla (`Registros`) de un sitio con el formato común de los
+    anexos: título en las filas 0–2, subtítulo en la 3 y encabezado en la 5.
+    Usa el modo `constant_memory` de xlsxwriter: cada fila se vuelca al disco
+    apenas se escribe, y los anchos de columna se van midiendo en el camino.
+    """
+    import xlsxwriter
+    spec     = SPEC_BY_NUM[num]
+    columnas = tabla.columnas
+    n        = len(columnas)
+    book = xlsxwriter.Workbook(target, {"constant_memory": True,
+                                        "default_date_format": FORMATO_FECHA})
+    try:
+        fmt   = {name: book.add_format(props) for name, props in FORMATOS.items()}
+        sheet = book.add_worksheet(spec["hoja"])
+        # En este modo las filas se escriben en orden y el formato de columna
+        # se aplica al escribir cada celda: todo eso va antes que los datos
+        sheet.set_row(0,30); sheet.set_row(1,20); sheet.set_row(2,20); sheet.set_row(3,25)
+        sheet.set_column(0, n-1, None, fmt["celda"])
+        sheet.merge_range(0,0,2,n-1,spec["titulo"].format(sitio=sitio), fmt["titulo"])
+        sheet.merge_range(3,0,3,n-1,spec["subtitulo"], fmt["subtitulo"])
+        sheet.write_row(5, 0, columnas, fmt["hdr"])
+
+        anchos = [len(col) for col in columnas]
+        for r, fila in enumerate(tabla, start=6):
+            sheet.write_row(r, 0, fila)
+            for c, val in enumerate(fila):
+                if val is not None:
+                    w = len(str(val))
+                    if w > anchos[c]:
+                        anchos[c] = w
+        for c, w in enumerate(anchos):
+            sheet.set_column(c, c, w + 2, fmt["celda"])
+    finally:
+        book.close()
+
+# Archivos de carga: UTF-8 sin BOM, separados por tabulador, una línea de
+# encabezado y sin comillas (LSMW no las entiende)
+SEPARADOR_CARGA = "\t"
+_LIMPIAR_CARGA  = str.maketrans({SEPARADOR_CARGA: " ", "\r": " ", "\n": " "})
+
+def texto_carga(val):
+    """Valor de una celda como lo espera la carga: fechas AAAAMMDD, booleanos X."""
+    if val is None:
+        return ""
+    if isinstance(val, bool):
+        return "X" if val else ""
+    if isinstance(val, float) and val.is_integer():
+        return str(int(val))
+    if isinstance(val, datetime.date):   # también datetime
+        return val.strftime("%Y%m%d")
+    if isinstance(val, datetime.time):
+        return val.strftime("%H%M%S")
+    return str(val).translate(_LIMPIAR_CARGA)
+
+def write_site_carga(tabla, target, num, sitio):
+    """
+    Escribe la tabla de un sitio (o una `TablaUnida`) como archivo plano de
+    carga masiva: las columnas `carga` de su spec, en ese orden; las que el
+    árbol no trae se omiten. En el archivo único (`sitio` None) la columna
+    de grupo va primero si `carga` no la incluye, para saber de qué sitio es
+    cada fila. `target` es una ruta o un archivo binario.
+    """
+    spec     = SPEC_BY_NUM[num]
+    orden    = spec["carga"]
+    if sitio is None and spec["grupo"] not in orden:
+        orden = [spec["grupo"], *orden]
+    columnas = list(tabla.columnas)
+    idxs     = [columnas.index(c) for c in dict.fromkeys(orden) if c in columnas]
+    if not idxs:
+        idxs = list(range(len(columnas)))
+    fh = open(target, "wb") if isinstance(target, str) else target
+    try:
+        sep = SEPARADOR_CARGA
+        fh.write((sep.join(columnas[i] for i in idxs) + "\r\n").encode("utf-8"))
+        for fila in tabla:
+            fh.write((sep.join(texto_carga(fila[i]) for i in idxs) + "\r\n").encode("utf-8"))
+    finally:
+        if fh is not target:
+            fh.close()
+
+# Escritor de cada trabajo según la extensión de su archivo
+ESCRITORES = {".xlsx": write_site_xlsx, EXT_CARGA: write_site_carga}
+
+def write_anexo(num, registros, out_dir):
+    """Escribe un Anexo `num` por sitio en `out_dir` (en serie)."""
+    if not registros:
+        return
+    usados = set()
+    for sitio, tabla in site_tables(num, registros):
+        name = unique_name(site_filename(SPEC_BY_NUM[num]["hoja"], sitio), usados)
+        write_site_xlsx(tabla, os.path.join(out_dir, name + ".xlsx"), num, sitio)
@@ -0,0 +1,167 @@
+# anexos_specs.py
+"""
+Definición declarativa de los anexos. Cada anexo es un dict con:
+
+- num, carpeta, hoja: número, subcarpeta de salida y nombre de la hoja/archivo.
+- titulo, subtitulo: textos de las filas 0–3 (`titulo` admite {sitio}).
+- campos: {columna de salida: keywords del encabezado}; None = valor que
+  devuelve el filtro. Con `opcionales` las columnas ausentes se omiten.
+- filtro: (tipo, argumentos...) que decide si una fila entra al anexo; los
+  tipos los compila `anexos_core.FILTROS`.
+- grupo: columna de salida por la que se separan los archivos por sitio;
+  `quitar_grupo` la saca de la tabla.
+- numerar: nombre de una columna correlativa (1..N sobre todo el anexo).
+- carga: columnas del archivo plano de carga masiva (LSMW), en el orden en
+  que las pide la transacción: primero la clave del objeto. Se toman de la
+  tabla antes de `quitar_grupo`; las que el árbol no trae se omiten, y las
+  que no figuren aquí no van al archivo.
+
+Agregar un anexo nuevo es agregar una entrada a SPECS.
+"""
+
+# Keywords de la columna de sitio (Campo de clasificación)
+SITIO = ["CAMPO","CLASIFICACION"]
+
+GREEN  = "FF00B050"
+YELLOW = "FFFF00"
+RED    = "FF0000"
+
+CAMPOS_ANEXO8 = {
+    "Sitio":                        ["CAMPO","CLASIFICACION"],
+    "Equipo":                       ["NIVEL8"],
+    "Denominación de objeto técnico":["DENOMINACION"],
+    "Tipo de equipo":               ["TIPO","EQUIPO"],
+    "Tp.objeto técnico":            ["TP.OBJETO","TECNICO"],
+    "Ubicación técnica":            ["UBICACION","TECNICA","SUPERIOR"],
+    "No QR":                        ["NIVEL7"]
+}
+
+# En el Anexo 9 las columnas que falten en el árbol simplemente se omiten;
+# Identificación SAP va justo antes de la denominación
+CAMPOS_ANEXO9 = {
+    "Equipo":                        ["NIVEL8"],
+    "Identificación SAP":            ["COD","SAP"],
+    "Denominación de objeto técnico":["DENOMINACION"],
+    "Tipo de equipo":                ["TIPO","EQUIPO"],
+    "Tp.objeto técnico":             ["TP.OBJETO","TECNICO"],
+    "Peso bruto":                    ["PESO","BRUTO"],
+    "Tamaño/Dimensión":              ["TAMANO"],
+    "Número de inventario":          ["INVENTARIO"],
+    "Fabricante del activo fijo":    ["FABRICANTE","ACTIVO"],
+    "País de fabricación":           ["PAIS","FABRICACION"],
+    "Denominación de tipo":          ["DENOMINACION","TIPO"],
+    "Año de construcción":           ["ANO","CONSTRUCCION"],
+    "Mes de construcción":           ["MES","CONSTRUCCION"],
+    "Número de pieza de fabricante": ["NUMERO","PIEZA"],
+    "Fabricante número de serie":    ["NUMERO","SERIE"],
+    "Centro emplazamiento":          ["CENTRO","EMPLAZ"],
+    "Emplazamiento":                 ["EMPLAZAMIENTO"],
+    "Área de empresa":               ["AREA","EMPRESA"],
+    "Indicador ABC":                 ["ASP"],
+    "Campo de clasificación":        ["CAMPO","CLASIFICACION"],
+    "Sociedad":                      ["SOCIEDAD"],
+    "Centro de coste":               ["CENTRO","COSTE"],
+    "Centro planificación":          ["CENTRO","PLANIF"],
+    "Grupo planificación":           ["GRUPO","PLANIF"],
+    "Pto.tbjo.responsable":          ["PTO.TBJO","RESPONSABLE"],
+    "Perfil de catálogo":            ["PERFIL","CATALOGO"],
+    "Ubicación técnica":             ["UBICACION","TECNICA","SUPERIOR"],
+}
+
+CAMPOS_ANEXO10 = {
+    "Sitio":                         ["CAMPO","CLASIFICACION"],
+    "Equipo":                        ["NIVEL8"],
+    "Denominación de objeto técnico":["DENOMINACION"],
+    "Ubicación técnica":             ["UBICACION","TECNICA","SUPERIOR"]
+}
+
+CAMPOS_ANEXO11 = {
+    "Sitio":                       ["CAMPO","CLASIFICACION"],
+    "Identificación SAP":          ["COD","SAP"],
+    "DENOMINACIÓN":                ["DENOMINACION"],
+    "Tipo de equipo":              ["TIPO","EQUIPO"],
+    "Tp.objeto técnico":           ["TP.OBJETO","TECNICO"],
+    "Centro planif.":              ["CENTRO","PLANIF"],
+    "Ubicación técnica superior":  ["UBICACION","TECNICA","SUPERIOR"]
+}
+
+# "Ubicación técnica" del Anexo 12 (None) es la celda NIVEL5–7 que salió verde
+CAMPOS_ANEXO12 = {
+    "Sitio":                                ["CAMPO","CLASIFICACION"],
+    "Ubicación técnica":                    None,
+    "Tipo ubic.técnica":                    ["TIPO","EQUIPO"],
+    "Denominación de la ubicación técnica": ["DENOMINACION"],
+    "Tp.objeto técnico":                    ["TP.OBJETO","TECNICO"],
+    "Centro emplazamiento":                 ["CENTRO","EMPLAZ"],
+    "Campo de clasificación":               ["CAMPO","CLASIFICACION"],
+    "Sociedad":                             ["SOCIEDAD"],
+    "Centro de coste":                      ["CENTRO","COSTE"],
+    "Centro planificación":                 ["CENTRO","PLANIF"],
+    "Ubicación técnica superior":           ["UBICACION","TECNICA","SUPERIOR"]
+}
+
+TITULO = "INFORME DE ANÁLISIS DE CRITICIDAD A ESTACIÓN {sitio}"
+
+SPECS = [
+    {
+        "num": 8, "carpeta": "Anexo8_QR", "hoja": "Anexo8",
+        "titulo": TITULO,
+        "subtitulo": "Anexo 8 – Listado de equipos pendientes por asignación de QR en campo",
+        "campos": CAMPOS_ANEXO8,
+        "filtro": ("texto", ["NIVEL7"], "NO QR"),
+        "grupo": "Sitio", "quitar_grupo": True,
+        "carga": ["Equipo", "No QR", "Denominación de objeto técnico", "Tipo de equipo",
+                  "Tp.objeto técnico", "Ubicación técnica"],
+    },
+    {
+        "num": 9, "carpeta": "Anexo9_Incorp", "hoja": "Anexo9",
+        "titulo": TITULO,
+        "subtitulo": "Anexo 9 – Listado de equipos de incorporación en SAP (060)",
+        "campos": CAMPOS_ANEXO9, "opcionales": True,
+        "filtro": ("fuente_contiene", ["NIVEL8"], GREEN),
+        "grupo": "Campo de clasificación", "quitar_grupo": True,
+        "carga": ["Equipo", "Tipo de equipo", "Identificación SAP",
+                  "Denominación de objeto técnico", "Tp.objeto técnico", "Peso bruto",
+                  "Tamaño/Dimensión", "Número de inventario", "Fabricante del activo fijo",
+                  "País de fabricación", "Denominación de tipo", "Año de construcción",
+                  "Mes de construcción", "Número de pieza de fabricante",
+                  "Fabricante número de serie", "Centro emplazamiento", "Emplazamiento",
+                  "Área de empresa", "Indicador ABC", "Campo de clasificación", "Sociedad",
+                  "Centro de coste", "Centro planificación", "Grupo planificación",
+                  "Pto.tbjo.responsable", "Perfil de catálogo", "Ubicación técnica"],
+    },
+    {
+        "num": 10, "carpeta": "Anexo10_Modif", "hoja": "Anexo10",
+        "titulo": TITULO,
+        "subtitulo": "Anexo 10 – Listado de equipos modificados en SAP",
+        "campos": CAMPOS_ANEXO10,
+        "filtro": ("fuente_termina", ["NIVEL8"], YELLOW),
+        "grupo": "Sitio", "quitar_grupo": True,
+        "carga": ["Equipo", "Denominación de objeto técnico", "Ubicación técnica"],
+    },
+    {
+        "num": 11, "carpeta": "Anexo11_Desinc", "hoja": "Anexo11",
+        "titulo": TITULO,
+        "subtitulo": "Anexo 11 – Listado de equipos desincorporados en SAP",
+        "campos": CAMPOS_ANEXO11,
+        "filtro": ("fuente_termina", ["NIVEL8"], RED),
+        "grupo": "Sitio", "quitar_grupo": False,
+        "carga": ["Identificación SAP", "Sitio", "DENOMINACIÓN", "Tipo de equipo",
+                  "Tp.objeto técnico", "Centro planif.", "Ubicación técnica superior"],
+    },
+    {
+        "num": 12, "carpeta": "Anexo12_UbicCre", "hoja": "Anexo12",
+        "titulo": TITULO,
+        "subtitulo": "Anexo 12 – Listado de ubicaciones técnicas creadas en SAP",
+        "campos": CAMPOS_ANEXO12,
+        "filtro": ("color_en", [["NIVEL5"], ["NIVEL6"], ["NIVEL7"]], GREEN),
+        "grupo": "Sitio", "quitar_grupo": True,
+        "numerar": "#",
+        "carga": ["Ubicación técnica", "Tipo ubic.técnica",
+                  "Denominación de la ubicación técnica", "Tp.objeto técnico",
+                  "Centro emplazamiento", "Campo de clasificación", "Sociedad",
+                  "Centro de coste", "Centro planificación", "Ubicación técnica superior"],
+    },
+]
+
+SPEC_BY_NUM = {spec["num"]: spec for spec in SPECS}
@@ -1,55 +1,280 @@
 # app.py
+"""
+Servidor web de los anexos. En producción se sirve con gunicorn
+(`gunicorn -c gunicorn.conf.py app:app`); `python app.py` levanta el
+servidor de desarrollo de Flask.
+
+Cada proceso de gunicorn tiene su propia caché de trabajos en memoria y sus
+propias métricas (ver `jobs` y `metrics`).
+"""
+import logging
 import os
-import zipfile
+import re
+import secrets
+import shutil
 import tempfile
+import time
+import zipfile
+from functools import partial
 
 
 from flask import (
-    Flask, render_template, request,
-    send_file, flash, redirect, url_for
+    Flask, Response, render_template, request,
+    send_file, flash, redirect, url_for, jsonify, abort, g
 )
-from anexos_logic import run_all_anexos
+from anexos_core import GENERATOR_VERSION, anexo_nums, check_salida, spill_activo
+from anexos_specs import SPECS
+from equipment_index import default_index
+from jobs import ColaLlena, JobManager
+from metrics import METRICAS, start_tracing
+from result_cache import default_cache
 
 app = Flask(__name__)
-app.secret_key = "cambiar_por_una_clave_segura"
+
+# Sin ANEXOS_SECRET_KEY se usa una clave al azar: con preload_app la comparten
+# todos los workers, pero cambia en cada reinicio (los mensajes flash en
+# curso se pierden, nada más)
+app.secret_key = os.environ.get("ANEXOS_SECRET_KEY") or secrets.token_hex(32)
+if "ANEXOS_SECRET_KEY" not in os.environ:
+    logging.getLogger(__name__).warning("ANEXOS_SECRET_KEY no está definida; se usa una clave temporal.")
+
+# Tamaño máximo de una subida; más que eso se rechaza con 413
+app.config["MAX_CONTENT_LENGTH"] = int(os.environ.get("ANEXOS_MAX_UPLOAD_MB", "200")) << 20
+
+# Carpetas de trabajo de cada petición (ver `_carpeta_peticion`)
+TMP_DIR = os.environ.get("ANEXOS_TMP_DIR", tempfile.gettempdir())
+TMP_PREFIX = "anexos_req_"
+os.makedirs(TMP_DIR, exist_ok=True)
+
+# Procesos que escriben los archivos por sitio (0 = todos los núcleos)
+ANEXOS_WORKERS = int(os.environ.get("ANEXOS_WORKERS", "1")) or None
+
+# Pico de memoria por fase en /metrics y run_report.json (tiene costo: solo para diagnosticar)
+if os.environ.get("ANEXOS_TRACEMALLOC") == "1":
+    start_tracing()
+
+# ZIPs ya generados, indexados por el contenido del archivo subido
+cache = default_cache()
+
+# Filas clasificadas de las cargas indexadas (POST /indice), para consultas JSON.
+# En producción conviene fijar ANEXOS_INDICE_DB: por defecto va a la carpeta
+# temporal del sistema, que puede vaciarse
+indice = default_index()
+
+# Trabajos en segundo plano (POST /jobs)
+jobs = JobManager(
+    os.environ.get("ANEXOS_JOBS_DIR", os.path.join(tempfile.gettempdir(), "anexos_jobs")),
+    max_workers    = int(os.environ.get("ANEXOS_JOBS_WORKERS", "2")),
+    max_pending    = int(os.environ.get("ANEXOS_JOBS_MAX_PENDING", "8")),
+    ttl            = int(os.environ.get("ANEXOS_JOBS_TTL", "3600")),
+    render_workers = ANEXOS_WORKERS,
+    cache          = cache,
+)
+
+def _limpiar_carpetas_viejas(max_horas=24):
+    """Borra carpetas de petición que dejó un proceso que murió a medio enviar."""
+    limite = time.time() - max_horas * 3600
+    for name in os.listdir(TMP_DIR):
+        path = os.path.join(TMP_DIR, name)
+        try:
+            if name.startswith(TMP_PREFIX) and os.path.getmtime(path) < limite:
+                shutil.rmtree(path, ignore_errors=True)
+        except FileNotFoundError:
+            pass
+
+_limpiar_carpetas_viejas()
+
+def _carpeta_peticion():
+    """
+    Carpeta temporal de la petición en curso (se crea al pedirla; hoy solo
+    la usa el archivo de `spill`). Se borra
+    cuando el servidor termina de enviar la respuesta, aunque el cliente
+    corte antes, o al fallar la petición.
+    """
+    if "carpeta" not in g:
+        g.carpeta = tempfile.mkdtemp(prefix=TMP_PREFIX, dir=TMP_DIR)
+    return g.carpeta
+
+@app.after_request
+def _borrar_al_cerrar(response):
+    carpeta = g.pop("carpeta", None)
+    if carpeta is not None:
+        response.call_on_close(partial(shutil.rmtree, carpeta, ignore_errors=True))
+    return response
+
+@app.teardown_request
+def _borrar_si_fallo(exc):
+    carpeta = g.pop("carpeta", None)   # solo queda si no llegó a after_request
+    if carpeta is not None:
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+def _seleccion():
+    """
+    (anexos, sitios, salida) pedidos en el formulario o en la query string;
+    None = todos. Se aceptan valores repetidos o separados por coma o salto
+    de línea: ?anexos=11&sitios=EST 1,EST 2&salida=carga. ValueError si un
+    anexo o la salida no existen.
+    """
+    def lista(nombre):
+        vals = [v.strip() for raw in request.values.getlist(nombre) for v in re.split(r"[,\n]", raw)]
+        return [v for v in vals if v] or None
+    anexos = lista("anexos")
+    if anexos is not None:
+        anexos = list(anexo_nums(anexos))
+    return anexos, lista("sitios"), check_salida(request.values.get("salida"))
+
+def _medir_envio(chunks, vista, t0):
+    """Pasa los bytes de la respuesta y al terminar de enviarlos registra la petición."""
+    enviados = 0
+    try:
+        for chunk in chunks:
+            enviados += len(chunk)
+            yield chunk
+    finally:
+        METRICAS.observar("anexos_peticion_segundos", time.perf_counter() - t0, vista=vista)
+        METRICAS.sumar("anexos_respuesta_bytes_total", enviados, vista=vista)
 
 @app.route("/", methods=("GET","POST"))
 def upload():
     if request.method == "POST":
+        t0 = time.perf_counter()
         f = request.files.get("file")
         if not f or not f.filename.lower().endswith(".xlsx"):
             flash("Por favor sube un archivo .xlsx válido.")
             return redirect(request.url)
 
-        # Guardar XLSX en carpeta temporal
-        tmpdir = tempfile.mkdtemp()
-        in_path = os.path.join(tmpdir, f.filename)
-        f.save(in_path)
-
-        # Carpeta raíz de salida
-        out_root = os.path.join(tmpdir, "Anexos_Todos")
-        os.makedirs(out_root, exist_ok=True)
+        # El XLSX se lee desde memoria: no se crean carpetas temporales
+        data = f.read()
 
         try:
-            run_all_anexos(in_path, out_root)
+            anexos, sitios, salida = _seleccion()
+            chunks = cache.zip_chunks(data, workers=ANEXOS_WORKERS, anexos=anexos, sitios=sitios,
+                                      salida=salida,
+                                      directorio=_carpeta_peticion() if spill_activo() else None)
         except Exception as e:
             flash(f"Error durante el procesamiento: {e}")
             return redirect(request.url)
 
-        # Empaquetar en ZIP
-        zip_path = os.path.join(tmpdir, "anexos.zip")
-        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
-            for root, _, files in os.walk(out_root):
-                for name in files:
-                    full = os.path.join(root, name)
-                    rel  = os.path.relpath(full, out_root)
-                    zf.write(full, rel)
+        # Cada anexo entra al ZIP (sin recomprimir) apenas se escribe
+        return Response(_medir_envio(chunks, "upload", t0),
+                        mimetype="application/zip",
+                        headers={"Content-Disposition": "attachment; filename=anexos.zip"})
+
+    return render_template("upload.html", specs=SPECS)
+
+@app.errorhandler(413)
+def upload_demasiado_grande(e):
+    limite = app.config["MAX_CONTENT_LENGTH"] >> 20
+    mensaje = f"El archivo supera el máximo de {limite} MB."
+    if request.path == "/":
+        flash(mensaje)
+        return redirect(request.url)
+    return jsonify(error=mensaje), 413
+
+@app.route("/health")
+def health():
+    """Para el balanceador: el proceso responde y sus carpetas de trabajo existen."""
+    carpetas = {"cache": cache.cache_dir, "trabajos": jobs.results_dir, "temporal": TMP_DIR}
+    faltan = [nombre for nombre, path in carpetas.items() if not os.access(path, os.W_OK)]
+    estado = {"estado": "error" if faltan else "ok", "version": GENERATOR_VERSION,
+              "pid": os.getpid(), "trabajos": jobs.counts()}
+    if faltan:
+        estado["sin_escritura"] = faltan
+    return jsonify(estado), 503 if faltan else 200
+
+@app.route("/cache/stats")
+def cache_stats():
+    return jsonify(cache.stats())
+
+@app.route("/metrics")
+def metrics():
+    for clave, valor in cache.stats().items():
+        METRICAS.fijar("anexos_cache", valor, dato=clave)
+    for estado, n in jobs.counts().items():
+        METRICAS.fijar("anexos_trabajos", n, estado=estado)
+    METRICAS.fijar("anexos_proceso", 1, pid=os.getpid())
+    return Response(METRICAS.exponer(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/jobs", methods=("POST",))
+def job_create():
+    f = request.files.get("file")
+    if not f or not f.filename.lower().endswith(".xlsx"):
+        return jsonify(error="Por favor sube un archivo .xlsx válido."), 400
+    try:
+        anexos, sitios, salida = _seleccion()
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    try:
+        job_id = jobs.submit(f.read(), f.filename, anexos, sitios, salida)
+    except ColaLlena as e:
+        return jsonify(error=str(e)), 503
+    return jsonify(id=job_id,
+                   estado=url_for("job_status", job_id=job_id),
+                   resultado=url_for("job_result", job_id=job_id)), 202
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    job = jobs.status(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job)
+
+@app.route("/jobs/<job_id>/zip")
+def job_result(job_id):
+    path = jobs.result_path(job_id)
+    if path is None:
+        job = jobs.status(job_id)
+        if job is None:
+            abort(404)
+        return jsonify(error="El trabajo aún no ha terminado.", estado=job["estado"]), 409
+    try:
+        return send_file(path, as_attachment=True, download_name="anexos.zip")
+    except FileNotFoundError:   # expiró justo ahora
+        abort(404)
+
+def _carga_pedida():
+    """Id de carga de ?carga= (None = la última); ValueError si no es un número."""
+    carga = request.args.get("carga")
+    return int(carga) if carga else None
+
+@app.route("/indice", methods=("POST",))
+def indice_cargar():
+    f = request.files.get("file")
+    if not f or not f.filename.lower().endswith(".xlsx"):
+        return jsonify(error="Por favor sube un archivo .xlsx válido."), 400
+    try:
+        carga = indice.cargar(f.read(), f.filename, request.values.get("hoja") or None)
+    except (ValueError, KeyError, zipfile.BadZipFile) as e:
+        # KeyError / BadZipFile: el archivo no es un .xlsx bien formado
+        return jsonify(error=f"No se pudo leer el archivo: {e}"), 400
+    return jsonify(carga), 201
+
+@app.route("/indice/cargas")
+def indice_cargas():
+    return jsonify(indice.cargas())
 
-        return send_file(zip_path,
-                         as_attachment=True,
-                         download_name="anexos.zip")
+@app.route("/indice/sitios/<path:sitio>")
+def indice_sitio(sitio):
+    try:
+        anexos, _, _ = _seleccion()
+        resultado = indice.sitio(sitio, anexos, _carga_pedida())
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    if resultado is None:
+        return jsonify(error="No hay cargas indexadas con ese id."), 404
+    return jsonify(resultado)
 
-    return render_template("upload.html")
+@app.route("/indice/equipos/<path:codigo>")
+def indice_equipo(codigo):
+    try:
+        resultado = indice.equipo(codigo, _carga_pedida())
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    if resultado is None:
+        return jsonify(error="No hay cargas indexadas con ese id."), 404
+    return jsonify(resultado)
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    # Solo para desarrollo: en producción va gunicorn (ver gunicorn.conf.py)
+    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", "5000")),
+            debug=os.environ.get("ANEXOS_DEBUG") == "1")
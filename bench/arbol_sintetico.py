@@ -0,0 +1,123 @@
+# bench/arbol_sintetico.py
+"""
+Genera Árboles de Equipos sintéticos para medir el generador de anexos.
+
+Las columnas llevan los nombres que buscan los specs, el encabezado cae en
+una fila al azar dentro de las primeras 20 (con un título encima, como en
+los archivos reales) y las marcas que disparan cada anexo salen en las
+proporciones pedidas:
+
+- `no_qr`: celdas "NO QR" en NIVEL7 (Anexo 8)
+- `verde`, `amarillo`, `rojo`: fuente de NIVEL8 (Anexos 9, 10 y 11)
+- `relleno_verde`: relleno verde en una de NIVEL5–7 (Anexo 12)
+
+Se escribe con xlsxwriter en modo `constant_memory`, así un millón de filas
+no ocupa más memoria que unas pocas.
+
+    python bench/arbol_sintetico.py arbol.xlsx --filas 100000 --sitios 40
+"""
+import argparse
+import random
+
+# Encabezado tal como aparece en los Árboles de Equipos
+COLUMNAS = [
+    "Nivel5", "Nivel6", "Nivel7", "Nivel8", "Denominación", "Tipo de equipo",
+    "Tp.objeto técnico", "Ubicación técnica superior", "Cod SAP", "Peso bruto",
+    "Tamaño/Dimensión", "Número de inventario", "Fabricante activo fijo",
+    "País de fabricación", "Denominación de tipo", "Año de construcción",
+    "Mes de construcción", "Número de pieza fabricante", "Número de serie",
+    "Centro emplazamiento", "Emplazamiento", "Área de empresa", "ASP",
+    "Campo de clasificación", "Sociedad", "Centro de coste", "Centro planificación",
+    "Grupo planificación", "Pto.tbjo.responsable", "Perfil de catálogo",
+]
+NIVEL7, NIVEL8 = 2, 3
+
+TIPOS       = ["BOMBA", "MOTOR", "VALVULA", "TABLERO", "TRANSFORMADOR", "SENSOR"]
+FABRICANTES = ["ABB", "SIEMENS", "WEG", "SCHNEIDER", "FLOWSERVE"]
+PAISES      = ["DE", "BR", "US", "FR", "CN"]
+
+PROPORCIONES = {"no_qr": 0.05, "verde": 0.08, "amarillo": 0.06, "rojo": 0.04,
+                "relleno_verde": 0.05}
+
+
+def filas_sinteticas(filas, sitios, rnd):
+    """Valores de cada fila del árbol (sin colores)."""
+    nombres = [f"EST {k:03d}" for k in range(sitios)]
+    for i in range(filas):
+        sitio = rnd.choice(nombres)
+        tipo  = rnd.choice(TIPOS)
+        ut    = f"{sitio[4:]}-{i // 200:04d}"
+        yield [
+            f"UT5-{ut}", f"UT6-{ut}-{i // 20:05d}", f"QR{i:07d}", f"EQ{i:07d}",
+            f"{tipo} {i}", tipo, f"TP-{tipo[:3]}", f"UT-{ut}", 10_000_000 + i,
+            round(rnd.uniform(1, 2000), 1), f"{rnd.randint(1, 9)}x{rnd.randint(1, 9)}",
+            f"INV{i:08d}", rnd.choice(FABRICANTES), rnd.choice(PAISES), f"MOD-{i % 97}",
+            rnd.randint(1980, 2024), rnd.randint(1, 12), f"P{i:07d}", f"S{rnd.getrandbits(32):08X}",
+            "CE01", "EMP01", "AE01", rnd.choice("ABC"), sitio, "SOC1", "CC100",
+            "CP01", "GP01", "PT-01", "CAT-01",
+        ]
+
+
+def generar(path, filas, sitios=20, seed=0, **proporciones):
+    """
+    Escribe en `path` un árbol de `filas` filas repartidas en `sitios` sitios.
+    Las proporciones no dadas toman los valores de PROPORCIONES. Devuelve la
+    fila (desde 1) del encabezado.
+    """
+    import xlsxwriter
+    p   = {**PROPORCIONES, **proporciones}
+    rnd = random.Random(seed)
+    header_row = rnd.randint(1, 20)
+
+    book = xlsxwriter.Workbook(path, {"constant_memory": True})
+    try:
+        fuente = {
+            "verde":    book.add_format({"font_color": "#00B050"}),
+            "amarillo": book.add_format({"font_color": "#FFFF00"}),
+            "rojo":     book.add_format({"font_color": "#FF0000"}),
+        }
+        relleno = book.add_format({"pattern": 1, "bg_color": "#00B050"})
+        hdr     = book.add_format({"bold": True})
+        sheet   = book.add_worksheet("Arbol")
+
+        if header_row > 1:
+            sheet.write(0, 0, "ÁRBOL DE EQUIPOS (sintético)")
+        sheet.write_row(header_row - 1, 0, COLUMNAS, hdr)
+
+        limites = [("verde", p["verde"]), ("amarillo", p["amarillo"]), ("rojo", p["rojo"])]
+        for r, vals in enumerate(filas_sinteticas(filas, sitios, rnd), start=header_row):
+            if rnd.random() < p["no_qr"]:
+                vals[NIVEL7] = "NO QR"
+            sheet.write_row(r, 0, vals)
+
+            x = rnd.random()
+            for color, frac in limites:
+                if x < frac:
+                    sheet.write(r, NIVEL8, vals[NIVEL8], fuente[color])
+                    break
+                x -= frac
+            if rnd.random() < p["relleno_verde"]:
+                c = rnd.randrange(3)
+                sheet.write(r, c, vals[c], relleno)
+    finally:
+        book.close()
+    return header_row
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("salida", help="ruta del .xlsx a generar")
+    ap.add_argument("--filas", type=int, default=10_000)
+    ap.add_argument("--sitios", type=int, default=20)
+    ap.add_argument("--seed", type=int, default=0)
+    for nombre, valor in PROPORCIONES.items():
+        ap.add_argument(f"--{nombre.replace('_', '-')}", type=float, default=valor,
+                        help=f"fracción de filas (por defecto {valor})")
+    args = ap.parse_args(argv)
+    header_row = generar(args.salida, args.filas, args.sitios, args.seed,
+                         **{n: getattr(args, n) for n in PROPORCIONES})
+    print(f"{args.salida}: {args.filas} filas, {args.sitios} sitios, encabezado en la fila {header_row}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+# bench/bench_anexos.py
+"""
+Mide el generador de anexos sobre árboles sintéticos de distintos tamaños.
+
+Por cada tamaño se genera (una sola vez, queda en `--datos`) un árbol con
+`arbol_sintetico` y se corre en un intérprete nuevo, así el pico de memoria
+(RSS) de cada medición es propio. Dos caminos:
+
+- stream (por defecto): el que usan el servidor y la CLI — encabezado,
+  clasificación en streaming, armado de tablas, escritura de cada anexo y
+  empaquetado del ZIP.
+- openpyxl: `load_workbook`, `detect_header` y cada `generate_anexoN` sobre la
+  hoja cargada, más el ZIP de la carpeta resultante. Carga el libro entero en
+  memoria, por eso por defecto se limita a los tamaños chicos.
+
+    python bench/bench_anexos.py                          # 1k, 10k, 100k y 1M filas
+    python bench/bench_anexos.py --filas 1000,20000 --modo stream,openpyxl
+    python bench/bench_anexos.py --json resultados.json   # para comparar corridas
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TAMANOS = "1000,10000,100000,1000000"
+
+
+def peak_rss_mb():
+    """Pico de memoria residente de este proceso en MB (None si no se puede medir)."""
+    try:
+        import resource
+    except ImportError:   # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1 << 20) if sys.platform == "darwin" else rss / 1024
+
+
+class Cronometro:
+    """Acumula segundos por fase en un dict ordenado."""
+
+    def __init__(self):
+        self.fases = {}
+
+    def sumar(self, fase, segundos):
+        self.fases[fase] = self.fases.get(fase, 0.0) + segundos
+
+    def medir(self, fase, func, *args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.sumar(fase, time.perf_counter() - t0)
+
+
+def medir_stream(path):
+    """Fases del camino en streaming (el de `zip_anexos`)."""
+    from anexos_core import open_sheet, plan_tasks, render_bytes, scan_rows
+    from xlsx_stream import XlsxReader
+    from zip_stream import iter_zip
+
+    c = Cronometro()
+    with XlsxReader(path) as book:
+        norm_hdr, rows = c.medir("encabezado", open_sheet, book, book.sheetnames[0])
+        registros = c.medir("clasificar", scan_rows, rows, norm_hdr, palette=book.palette)
+    tasks = c.medir("tablas", plan_tasks, registros)
+
+    def entradas():
+        for task in tasks:
+            t0 = time.perf_counter()
+            entry = render_bytes(task)
+            c.sumar(f"anexo{task[0]}", time.perf_counter() - t0)
+            yield entry
+
+    # El ZIP se arma a medida que se escriben los anexos: su fase es el total
+    # menos lo que tardó escribir cada .xlsx
+    t0 = time.perf_counter()
+    bytes_zip = sum(len(chunk) for chunk in iter_zip(entradas()))
+    escritos  = sum(v for k, v in c.fases.items() if k.startswith("anexo"))
+    c.sumar("zip", time.perf_counter() - t0 - escritos)
+    return c.fases, {"filas_anexo": {num: len(r) for num, r in registros.items()},
+                     "sitios": len(tasks), "bytes_zip": bytes_zip}
+
+
+def medir_openpyxl(path):
+    """Fases del camino con openpyxl: libro completo en memoria y un anexo a la vez."""
+    import openpyxl
+    import anexos_core
+    from anexos_core import ANEXOS, detect_header, normalize
+    from zip_stream import iter_zip
+
+    c  = Cronometro()
+    wb = c.medir("carga", openpyxl.load_workbook, path)
+    ws = wb.worksheets[0]
+    header_row = c.medir("encabezado", detect_header, ws)
+    norm_hdr   = [normalize(cell.value) for cell in ws[header_row]]
+
+    with tempfile.TemporaryDirectory() as out:
+        for subdir_name, num in ANEXOS:
+            out_dir = os.path.join(out, subdir_name)
+            os.makedirs(out_dir)
+            generate = getattr(anexos_core, f"generate_anexo{num}")
+            c.medir(f"anexo{num}", generate, ws, header_row, norm_hdr, out_dir)
+
+        def entradas():
+            for subdir_name, _ in ANEXOS:
+                for name in sorted(os.listdir(os.path.join(out, subdir_name))):
+                    with open(os.path.join(out, subdir_name, name), "rb") as fh:
+                        yield f"{subdir_name}/{name}", fh.read()
+        bytes_zip = c.medir("zip", lambda: sum(len(chunk) for chunk in iter_zip(entradas())))
+    return c.fases, {"bytes_zip": bytes_zip}
+
+
+MODOS = {"stream": medir_stream, "openpyxl": medir_openpyxl}
+
+
+def unidad(modo, path):
+    """Corre una medición en este proceso e imprime el resultado como JSON."""
+    t0 = time.perf_counter()
+    fases, extra = MODOS[modo](path)
+    print(json.dumps({"fases": fases, "total": time.perf_counter() - t0,
+                      "rss_mb": peak_rss_mb(), **extra}))
+
+
+def arbol(datos, filas, sitios, seed):
+    """Ruta del árbol sintético pedido, generándolo si aún no existe."""
+    import arbol_sintetico
+    path = os.path.join(datos, f"arbol_{filas}_{sitios}_{seed}.xlsx")
+    if not os.path.exists(path):
+        t0 = time.perf_counter()
+        arbol_sintetico.generar(path + ".tmp", filas, sitios, seed)
+        os.replace(path + ".tmp", path)
+        print(f"  generado {os.path.basename(path)} en {time.perf_counter() - t0:.1f}s",
+              file=sys.stderr)
+    return path
+
+
+def correr(modo, path):
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--unidad", modo, path],
+                          cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode:
+        return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr else "falló"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+FASES = ["carga", "encabezado", "clasificar", "tablas",
+         "anexo8", "anexo9", "anexo10", "anexo11", "anexo12", "zip"]
+
+
+def imprimir(resultados):
+    vistas = {fase for r in resultados for fase in r.get("fases", {})}
+    fases  = [f for f in FASES if f in vistas] + sorted(vistas - set(FASES))
+    cols = ["modo", "filas", *fases, "total", "RSS MB"]
+    print("  ".join(f"{c:>10}" for c in cols))
+    for r in resultados:
+        if "error" in r:
+            print(f"{r['modo']:>10}  {r['filas']:>10}  ERROR {r['error']}")
+            continue
+        celdas = [r["modo"], r["filas"], *(f"{r['fases'].get(f, 0):.2f}" for f in fases),
+                  f"{r['total']:.2f}", "-" if r["rss_mb"] is None else f"{r['rss_mb']:.0f}"]
+        print("  ".join(f"{c:>10}" for c in celdas))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--filas", default=TAMANOS, help=f"tamaños separados por coma (por defecto {TAMANOS})")
+    ap.add_argument("--sitios", type=int, default=40)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--modo", default="stream", help="stream, openpyxl o ambos separados por coma")
+    ap.add_argument("--openpyxl-max", type=int, default=100_000,
+                    help="tamaño máximo que se mide con openpyxl (por defecto 100000)")
+    ap.add_argument("--datos", default=os.path.join(tempfile.gettempdir(), "anexos_bench"),
+                    help="carpeta donde se guardan los árboles generados")
+    ap.add_argument("--json", help="guarda los resultados en este archivo")
+    ap.add_argument("--unidad", nargs=2, metavar=("MODO", "ARCHIVO"), help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.unidad:
+        unidad(*args.unidad)
+        return 0
+
+    os.makedirs(args.datos, exist_ok=True)
+    modos = [m.strip() for m in args.modo.split(",")]
+    for modo in modos:
+        if modo not in MODOS:
+            ap.error(f"modo desconocido: {modo}")
+
+    resultados = []
+    for filas in (int(n) for n in args.filas.split(",")):
+        path = arbol(args.datos, filas, args.sitios, args.seed)
+        for modo in modos:
+            if modo == "openpyxl" and filas > args.openpyxl_max:
+                continue
+            print(f"  {modo} {filas} filas…", file=sys.stderr)
+            resultados.append({"modo": modo, "filas": filas, **correr(modo, path)})
+
+    imprimir(resultados)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(resultados, fh, ensure_ascii=False, indent=1)
+    return 1 if any("error" in r for r in resultados) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
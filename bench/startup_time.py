@@ -0,0 +1,68 @@
+# bench/startup_time.py
+"""
+Mide cuánto cuesta importar el punto de entrada del servidor.
+
+Cada repetición arranca un intérprete nuevo con `-X importtime`, así no hay
+módulos en caché. Informa la mediana del tiempo total, los imports más caros
+y si se colaron módulos que el servidor no debería cargar al arrancar.
+
+    python bench/startup_time.py                 # import app
+    python bench/startup_time.py -m anexos_core -n 10
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Módulos que el arranque headless no debe importar
+PROHIBIDOS = ("tkinter", "pandas", "openpyxl", "xlsxwriter")
+
+
+def medir(module):
+    """Devuelve (segundos de pared, [(µs acumulados, módulo)], prohibidos cargados)."""
+    code = (f"import sys, {module}; "
+            f"print(','.join(m for m in {PROHIBIDOS!r} if m in sys.modules))")
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          cwd=ROOT, capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - t0
+
+    imports = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cum_us, name = line[len("import time:"):].split("|", 2)
+        imports.append((int(cum_us), name.strip()))
+    cargados = [m for m in proc.stdout.strip().split(",") if m]
+    return wall, imports, cargados
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("-m", "--module", default="app", help="módulo a importar (por defecto app)")
+    ap.add_argument("-n", "--repeat", type=int, default=5, help="repeticiones (por defecto 5)")
+    ap.add_argument("--top", type=int, default=15, help="imports más caros a mostrar")
+    args = ap.parse_args(argv)
+
+    walls, ultimo, cargados = [], [], []
+    for _ in range(args.repeat):
+        wall, ultimo, cargados = medir(args.module)
+        walls.append(wall)
+
+    print(f"import {args.module}: mediana {statistics.median(walls)*1000:.0f} ms "
+          f"(mín {min(walls)*1000:.0f} ms, {args.repeat} corridas)")
+    print(f"\n{'acumulado':>12}  módulo")
+    for cum, name in sorted(ultimo, reverse=True)[:args.top]:
+        print(f"{cum/1000:>9.1f} ms  {name}")
+    if cargados:
+        print(f"\nATENCIÓN: el arranque cargó {', '.join(cargados)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
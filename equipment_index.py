@@ -0,0 +1,258 @@
+# equipment_index.py
+"""
+Índice persistente (SQLite) de las filas clasificadas, para consultar qué
+equipos entran a cada anexo sin volver a leer el Árbol de Equipos.
+
+Cada archivo indexado es una "carga": sus filas quedan con anexo, sitio y
+código de equipo (NIVEL8), con índices por sitio y por código. Las consultas
+van por defecto a la carga más reciente, y solo se conservan las últimas
+`max_cargas`. Una carga se ve recién cuando terminó de escribirse.
+"""
+import datetime
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
+
+from anexos_core import (
+    GENERATOR_VERSION, SITIO, SPEC_BY_NUM, anexo_nums, compile_plan, find_col,
+    normalize, open_sheet,
+)
+from xlsx_stream import XlsxReader
+
+LOTE = 5000
+
+ESQUEMA = """
+    PRAGMA journal_mode = WAL;
+    CREATE TABLE IF NOT EXISTS cargas (
+        id      INTEGER PRIMARY KEY,
+        huella  TEXT NOT NULL,
+        archivo TEXT,
+        hoja    TEXT,
+        creada  REAL NOT NULL,
+        filas   INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS columnas (
+        carga    INTEGER NOT NULL,
+        anexo    INTEGER NOT NULL,
+        columnas TEXT    NOT NULL,
+        PRIMARY KEY (carga, anexo)
+    );
+    CREATE TABLE IF NOT EXISTS registros (
+        carga      INTEGER NOT NULL,
+        anexo      INTEGER NOT NULL,
+        sitio      TEXT,
+        sitio_norm TEXT,
+        equipo     TEXT,
+        seq        INTEGER NOT NULL,
+        fila       TEXT    NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS por_sitio  ON registros (carga, sitio_norm, anexo, seq);
+    CREATE INDEX IF NOT EXISTS por_equipo ON registros (equipo, carga);
+    CREATE INDEX IF NOT EXISTS por_anexo  ON registros (carga, anexo, seq);
+"""
+
+
+def _json(val):
+    """Valores de celda que json no sabe escribir (fechas, duraciones)."""
+    if isinstance(val, (datetime.date, datetime.time)):
+        return val.isoformat()
+    return str(val)
+
+
+def clave_sitio(sitio):
+    """Sitio normalizado como en `anexos_core.scan_rows`: sin mayúsculas ni tildes."""
+    return normalize(sitio).strip()
+
+
+def clave_equipo(codigo):
+    return str(codigo).strip().upper()
+
+
+class EquipmentIndex:
+    """Índice en el archivo SQLite `path`; cada operación abre su conexión."""
+
+    def __init__(self, path, max_cargas=5):
+        self.path = path
+        self.max_cargas = max_cargas
+        with self._conn() as conn:
+            conn.executescript(ESQUEMA)
+
+    @contextmanager
+    def _conn(self):
+        """Conexión propia de la operación: confirma al salir (o deshace) y se cierra."""
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # ── escritura ───────────────────────────────────────────────────────
+    @staticmethod
+    def huella(data, hoja=None):
+        h = hashlib.sha256(f"{GENERATOR_VERSION}\0{hoja or ''}\0".encode("utf-8"))
+        h.update(data)
+        return h.hexdigest()
+
+    def cargar(self, data, archivo="", hoja=None):
+        """
+        Clasifica los bytes de un .xlsx y guarda sus filas como una carga
+        nueva; devuelve su resumen (ver `carga`). Si el mismo archivo ya está
+        indexado se devuelve esa carga sin releerlo.
+        """
+        huella = self.huella(data, hoja)
+        with self._conn() as conn:
+            row = conn.execute("SELECT id FROM cargas WHERE huella = ? ORDER BY id DESC LIMIT 1",
+                               (huella,)).fetchone()
+        if row is not None:
+            return self.carga(row["id"])
+
+        with self._conn() as conn, XlsxReader(io.BytesIO(data)) as book:
+            hoja = hoja or book.sheetnames[0]
+            norm_hdr, rows = open_sheet(book, hoja)
+            cur = conn.execute(
+                "INSERT INTO cargas (huella, archivo, hoja, creada, filas) VALUES (?, ?, ?, ?, 0)",
+                (huella, archivo, hoja, time.time()))
+            carga = cur.lastrowid
+            filas = self._insertar(conn, carga, rows, norm_hdr, book.palette)
+            conn.execute("UPDATE cargas SET filas = ? WHERE id = ?", (filas, carga))
+            viejas = [r["id"] for r in conn.execute(
+                "SELECT id FROM cargas ORDER BY id DESC LIMIT -1 OFFSET ?", (self.max_cargas,))]
+            for vieja in viejas:
+                for tabla in ("registros", "columnas"):
+                    conn.execute(f"DELETE FROM {tabla} WHERE carga = ?", (vieja,))
+                conn.execute("DELETE FROM cargas WHERE id = ?", (vieja,))
+        return self.carga(carga)
+
+    @staticmethod
+    def _insertar(conn, carga, rows, norm_hdr, palette):
+        """Una pasada de clasificación (como `scan_rows`) que inserta cada fila."""
+        plan = compile_plan(tuple(norm_hdr), anexo_nums())
+        col_sitio  = find_col(norm_hdr, *SITIO)
+        col_equipo = find_col(norm_hdr, "NIVEL8")
+        for num, columnas, *_ in plan:
+            conn.execute("INSERT INTO columnas VALUES (?, ?, ?)",
+                         (carga, num, json.dumps(columnas, ensure_ascii=False)))
+        active = [(num, bind(palette), project) for num, _, bind, project, _ in plan]
+        seqs   = dict.fromkeys(SPEC_BY_NUM, 0)
+        lote   = []
+        n = 0
+        for n, (values, styles) in enumerate(rows, start=1):
+            sitio = values[col_sitio]
+            if sitio is None or sitio != sitio:   # vacío o NaN: no va a ningún anexo
+                continue
+            equipo = values[col_equipo]
+            equipo = clave_equipo(equipo) if equipo is not None else None
+            for num, match, project in active:
+                m = match(values, styles)
+                if m is None:
+                    continue
+                seqs[num] += 1
+                fila = json.dumps(project(values, m), ensure_ascii=False, default=_json)
+                lote.append((carga, num, str(sitio), clave_sitio(sitio), equipo, seqs[num], fila))
+            if len(lote) >= LOTE:
+                conn.executemany("INSERT INTO registros VALUES (?, ?, ?, ?, ?, ?, ?)", lote)
+                lote = []
+        conn.executemany("INSERT INTO registros VALUES (?, ?, ?, ?, ?, ?, ?)", lote)
+        return n
+
+    # ── consultas ───────────────────────────────────────────────────────
+    def cargas(self):
+        """Resumen de las cargas guardadas, la más reciente primero."""
+        with self._conn() as conn:
+            ids = [r["id"] for r in conn.execute("SELECT id FROM cargas ORDER BY id DESC")]
+        return [self.carga(carga) for carga in ids]
+
+    def carga(self, carga=None):
+        """
+        Resumen de una carga (por defecto la última): archivo, hoja, fecha,
+        filas leídas y registros por anexo. None si no existe.
+        """
+        with self._conn() as conn:
+            if carga is None:
+                row = conn.execute("SELECT * FROM cargas ORDER BY id DESC LIMIT 1").fetchone()
+            else:
+                row = conn.execute("SELECT * FROM cargas WHERE id = ?", (carga,)).fetchone()
+            if row is None:
+                return None
+            registros = {str(r["anexo"]): r["n"] for r in conn.execute(
+                "SELECT anexo, COUNT(*) AS n FROM registros WHERE carga = ? GROUP BY anexo",
+                (row["id"],))}
+            sitios = conn.execute("SELECT COUNT(DISTINCT sitio_norm) FROM registros WHERE carga = ?",
+                                  (row["id"],)).fetchone()[0]
+        return {
+            "id":        row["id"],
+            "archivo":   row["archivo"],
+            "hoja":      row["hoja"],
+            "creada":    datetime.datetime.fromtimestamp(row["creada"]).isoformat(timespec="seconds"),
+            "filas":     row["filas"],
+            "registros": registros,
+            "sitios":    sitios,
+        }
+
+    def _columnas(self, conn, carga):
+        return {r["anexo"]: json.loads(r["columnas"]) for r in conn.execute(
+            "SELECT anexo, columnas FROM columnas WHERE carga = ?", (carga,))}
+
+    def _id(self, conn, carga):
+        """Id de la carga pedida o de la última; None si no hay."""
+        if carga is None:
+            row = conn.execute("SELECT MAX(id) FROM cargas").fetchone()
+        else:
+            row = conn.execute("SELECT id FROM cargas WHERE id = ?", (carga,)).fetchone()
+        return row[0] if row else None
+
+    def sitio(self, sitio, anexos=None, carga=None):
+        """
+        Filas de un sitio (sin importar mayúsculas ni tildes) por anexo:
+        {"anexo": [{columna: valor}, ...]}, en el orden del árbol. None si
+        la carga no existe.
+        """
+        nums = anexo_nums(anexos)
+        with self._conn() as conn:
+            carga = self._id(conn, carga)
+            if carga is None:
+                return None
+            columnas = self._columnas(conn, carga)
+            out = {str(num): [] for num in nums}
+            marcas = ",".join("?" * len(nums))
+            cur = conn.execute(
+                f"SELECT anexo, fila FROM registros WHERE carga = ? AND sitio_norm = ? "
+                f"AND anexo IN ({marcas}) ORDER BY anexo, seq",
+                (carga, clave_sitio(sitio), *nums))
+            for r in cur:
+                out[str(r["anexo"])].append(dict(zip(columnas[r["anexo"]], json.loads(r["fila"]))))
+        return {"carga": carga, "sitio": sitio, "anexos": out}
+
+    def equipo(self, codigo, carga=None):
+        """Anexos y sitio en que aparece un código NIVEL8. None si la carga no existe."""
+        with self._conn() as conn:
+            carga = self._id(conn, carga)
+            if carga is None:
+                return None
+            columnas = self._columnas(conn, carga)
+            cur = conn.execute(
+                "SELECT anexo, sitio, fila FROM registros WHERE equipo = ? AND carga = ? "
+                "ORDER BY anexo, seq", (clave_equipo(codigo), carga))
+            registros = [{"anexo": r["anexo"], "sitio": r["sitio"],
+                          "fila": dict(zip(columnas[r["anexo"]], json.loads(r["fila"])))}
+                         for r in cur]
+        return {"carga": carga, "equipo": codigo, "registros": registros}
+
+
+def default_index():
+    """
+    Índice configurado por ANEXOS_INDICE_DB / ANEXOS_INDICE_MAX_CARGAS.
+    Sin ANEXOS_INDICE_DB el archivo va a la carpeta temporal del sistema, que
+    el sistema puede vaciar (p. ej. al reiniciar): para que el índice
+    persista de verdad hay que apuntarlo a un disco que se conserve.
+    """
+    path = os.environ.get("ANEXOS_INDICE_DB",
+                          os.path.join(tempfile.gettempdir(), "anexos_indice.sqlite"))
+    return EquipmentIndex(path, max_cargas=int(os.environ.get("ANEXOS_INDICE_MAX_CARGAS", "5")))
@@ -0,0 +1,50 @@
+# gunicorn.conf.py
+"""
+Configuración de producción: `gunicorn -c gunicorn.conf.py app:app`.
+
+Varios procesos (workers) con algunos hilos cada uno. Con `preload_app` el
+proceso maestro importa `app` (y con él el motor de anexos) una sola vez
+antes de crear los workers, que comparten esas páginas de memoria.
+
+Variables de entorno:
+- PORT: puerto (por defecto 5000).
+- ANEXOS_WEB_WORKERS: procesos (por defecto, uno por núcleo).
+- ANEXOS_WEB_THREADS: hilos por proceso (por defecto 4).
+- ANEXOS_WEB_TIMEOUT: segundos sin respuesta de un worker antes de
+  reiniciarlo (por defecto 300).
+- ANEXOS_MAX_UPLOAD_MB: tamaño máximo de una subida (lo aplica `app`).
+
+Los trabajos de POST /jobs corren en el worker que recibió la subida y
+/metrics cuenta solo lo del worker que atiende la consulta (ver `jobs` y
+`metrics`).
+"""
+import multiprocessing
+import os
+
+bind    = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get("ANEXOS_WEB_WORKERS", "0")) or multiprocessing.cpu_count()
+threads = int(os.environ.get("ANEXOS_WEB_THREADS", "4"))
+worker_class = "gthread"
+preload_app  = True
+
+# Las subidas grandes pueden tardar en clasificarse y enviarse
+timeout          = int(os.environ.get("ANEXOS_WEB_TIMEOUT", "300"))
+graceful_timeout = 60
+keepalive        = 5
+
+# Encabezados HTTP acotados; el cuerpo lo limita MAX_CONTENT_LENGTH en `app`
+limit_request_line   = 8190
+limit_request_fields = 100
+
+accesslog = "-"
+errorlog  = "-"
+
+
+def on_starting(server):
+    """
+    Antes de importar `app`: también las librerías que el motor carga recién
+    al usarse, así no las importa cada worker por separado.
+    """
+    import openpyxl.styles.numbers  # noqa: F401
+    import openpyxl.utils.datetime  # noqa: F401
+    import xlsxwriter  # noqa: F401
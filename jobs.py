@@ -0,0 +1,204 @@
+# jobs.py
+"""
+Trabajos en segundo plano para cargas grandes: el POST solo encola el
+archivo y un pool acotado de hilos genera el ZIP en disco mientras el cliente
+consulta el avance.
+
+Con varios procesos (gunicorn) cada trabajo corre en el proceso que recibió
+el POST, pero su estado también se guarda como `<id>.json` junto al ZIP: los
+demás procesos lo leen de allí. El avance fila a fila solo lo ve el proceso
+que corre el trabajo; los otros ven el último cambio de estado.
+"""
+import io
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from anexos_core import new_progress, zip_anexos
+
+EN_COLA    = "en_cola"
+PROCESANDO = "procesando"
+LISTO      = "listo"
+ERROR      = "error"
+
+
+class ColaLlena(Exception):
+    """Se alcanzó el máximo de trabajos pendientes."""
+
+
+class JobManager:
+    """
+    Encola trabajos de generación de anexos y guarda cada resultado como
+    `<id>.zip` en `results_dir`.
+
+    - `max_workers`: trabajos que se procesan a la vez.
+    - `max_pending`: trabajos en cola o en proceso admitidos; más allá de eso
+      `submit` lanza `ColaLlena`.
+    - `ttl`: segundos que se conserva un resultado (o un error) una vez
+      terminado; después se borra el ZIP y el trabajo deja de existir.
+    - `render_workers`: procesos que usa cada trabajo para escribir los .xlsx.
+    - `cache`: `ResultCache` opcional para no recalcular archivos repetidos.
+    """
+
+    def __init__(self, results_dir, max_workers=2, max_pending=8, ttl=3600, render_workers=1,
+                 cache=None):
+        self.results_dir    = results_dir
+        self.cache          = cache
+        self.max_pending    = max_pending
+        self.ttl            = ttl
+        self.render_workers = render_workers
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="anexos-job")
+        os.makedirs(results_dir, exist_ok=True)
+        self._remove_orphans()
+
+    def submit(self, data, filename="", anexos=None, sitios=None, salida="xlsx"):
+        """
+        Encola los bytes de un .xlsx y devuelve el id del trabajo. `anexos`,
+        `sitios` y `salida` eligen lo que se genera (ver
+        `anexos_core.run_all_anexos`).
+        """
+        self.expire()
+        with self._lock:
+            pending = sum(1 for j in self._jobs.values() if j["estado"] in (EN_COLA, PROCESANDO))
+            if pending >= self.max_pending:
+                raise ColaLlena(f"Hay {pending} trabajos pendientes; intenta más tarde.")
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "id":        job_id,
+                "archivo":   filename,
+                "anexos":    anexos,
+                "sitios":    sitios,
+                "salida":    salida,
+                "estado":    EN_COLA,
+                "cache":     False,
+                "progreso":  new_progress(),
+                "error":     None,
+                "creado":    time.time(),
+                "terminado": None,
+            }
+            self._guardar(self._jobs[job_id])
+        self._pool.submit(self._run, job_id, data, anexos, sitios, salida)
+        return job_id
+
+    def status(self, job_id):
+        """Copia del estado de un trabajo (None si no existe o ya expiró)."""
+        self.expire()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return self._snapshot(job)
+        return self._leer(job_id)
+
+    @staticmethod
+    def _snapshot(job):
+        snap = dict(job)
+        snap["progreso"] = {k: (dict(v) if isinstance(v, dict) else v)
+                            for k, v in job["progreso"].items()}
+        return snap
+
+    def _guardar(self, job):
+        """Escribe el estado del trabajo en disco (se llama con el lock tomado)."""
+        path = self._status_path(job["id"])
+        with open(path + ".part", "w", encoding="utf-8") as fh:
+            json.dump(self._snapshot(job), fh, ensure_ascii=False)
+        os.replace(path + ".part", path)
+
+    def _leer(self, job_id):
+        """Estado guardado por otro proceso, o None si no existe o ya expiró."""
+        if len(job_id) != 32 or not job_id.isalnum():   # ids de uuid4().hex
+            return None
+        try:
+            with open(self._status_path(job_id), encoding="utf-8") as fh:
+                job = json.load(fh)
+        except (FileNotFoundError, ValueError):
+            return None
+        if job["terminado"] is not None and job["terminado"] < time.time() - self.ttl:
+            self._borrar(job_id)
+            return None
+        return job
+
+    def counts(self):
+        """Cantidad de trabajos en memoria por estado."""
+        self.expire()
+        with self._lock:
+            counts = dict.fromkeys((EN_COLA, PROCESANDO, LISTO, ERROR), 0)
+            for job in self._jobs.values():
+                counts[job["estado"]] += 1
+            return counts
+
+    def result_path(self, job_id):
+        """Ruta del ZIP de un trabajo terminado, o None si aún no está listo."""
+        job = self.status(job_id)
+        if job is None or job["estado"] != LISTO:
+            return None
+        return self._zip_path(job_id)
+
+    def expire(self):
+        """Borra los trabajos terminados hace más de `ttl` segundos."""
+        limite = time.time() - self.ttl
+        with self._lock:
+            vencidos = [j for j, job in self._jobs.items()
+                        if job["terminado"] is not None and job["terminado"] < limite]
+            for job_id in vencidos:
+                del self._jobs[job_id]
+        for job_id in vencidos:
+            self._borrar(job_id)
+
+    def _borrar(self, job_id):
+        for path in (self._zip_path(job_id), self._status_path(job_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _remove_orphans(self):
+        """Borra resultados y estados vencidos que dejó un proceso anterior."""
+        limite = time.time() - self.ttl
+        for name in os.listdir(self.results_dir):
+            path = os.path.join(self.results_dir, name)
+            if not name.endswith((".zip", ".zip.part", ".json", ".json.part")):
+                continue
+            try:
+                if os.path.getmtime(path) < limite:
+                    os.remove(path)
+            except FileNotFoundError:   # lo borró otro proceso
+                pass
+
+    def _zip_path(self, job_id):
+        return os.path.join(self.results_dir, f"{job_id}.zip")
+
+    def _status_path(self, job_id):
+        return os.path.join(self.results_dir, f"{job_id}.json")
+
+    def _set(self, job_id, **campos):
+        with self._lock:
+            self._jobs[job_id].update(campos)
+            self._guardar(self._jobs[job_id])
+
+    def _run(self, job_id, data, anexos=None, sitios=None, salida="xlsx"):
+        self._set(job_id, estado=PROCESANDO)
+        final = self._zip_path(job_id)
+        part  = final + ".part"
+        try:
+            progress = self._jobs[job_id]["progreso"]
+            if self.cache is not None:
+                chunks = self.cache.zip_chunks(data, workers=self.render_workers, progress=progress,
+                                               anexos=anexos, sitios=sitios, salida=salida)
+            else:
+                chunks = zip_anexos(io.BytesIO(data), workers=self.render_workers, progress=progress,
+                                    anexos=anexos, sitios=sitios, salida=salida)
+            with open(part, "wb") as fh:
+                for chunk in chunks:
+                    fh.write(chunk)
+            os.replace(part, final)
+        except Exception as e:
+            if os.path.exists(part):
+                os.remove(part)
+            self._set(job_id, estado=ERROR, error=str(e), terminado=time.time())
+        else:
+            self._set(job_id, estado=LISTO, cache=progress["cache"], terminado=time.time())
@@ -0,0 +1,153 @@
+# metrics.py
+"""
+Instrumentación de las ejecuciones: segundos (y, con tracemalloc, pico de
+memoria) por fase, filas leídas, filas por anexo, sitios escritos y bytes
+producidos.
+
+El detalle de cada ejecución viaja en su dict de progreso (ver
+`anexos_core.new_progress`) y termina como `run_report.json` dentro del ZIP.
+Además cada ejecución se suma a `METRICAS`, que acumula por proceso y se
+expone en formato de texto de Prometheus. Con varios workers de gunicorn
+cada /metrics muestra solo el proceso que lo atiende; `anexos_proceso`
+dice cuál (por su pid).
+"""
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+REPORT = "run_report.json"
+
+
+def start_tracing():
+    """Activa tracemalloc: desde ahí cada fase registra su pico de memoria."""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+@contextmanager
+def fase(progress, nombre):
+    """Suma la duración del bloque a progress["fases"][nombre] (nada si no hay progress)."""
+    if progress is None:
+        yield
+        return
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        fases = progress["fases"]
+        fases[nombre] = fases.get(nombre, 0.0) + time.perf_counter() - t0
+        if tracing:
+            picos = progress["memoria_pico"]
+            picos[nombre] = max(picos.get(nombre, 0), tracemalloc.get_traced_memory()[1])
+
+
+def timed(items, progress, nombre):
+    """Deja pasar `items` sumando a la fase `nombre` solo el tiempo de producir cada uno."""
+    it = iter(items)
+    while True:
+        with fase(progress, nombre):
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+        yield item
+
+
+def report_bytes(progress, version):
+    """Contenido de run_report.json para una ejecución."""
+    data = {
+        "version":       version,
+        "generado":      time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "fases":         {k: round(v, 4) for k, v in progress["fases"].items()},
+        "memoria_pico":  progress["memoria_pico"],
+        "filas":         progress["filas"],
+        "registros":     progress["registros"],
+        "sitios":        progress["sitios"],
+        "bytes":         progress["bytes"],
+    }
+    return json.dumps(data, ensure_ascii=False, indent=1).encode("utf-8")
+
+
+# Familias expuestas: nombre → (tipo, ayuda)
+FAMILIAS = {
+    "anexos_ejecuciones_total":     ("counter", "Ejecuciones del generador por resultado."),
+    "anexos_fase_segundos":         ("summary", "Segundos por fase de la generación."),
+    "anexos_memoria_pico_bytes":    ("gauge",   "Pico de memoria (tracemalloc) de la última ejecución por fase."),
+    "anexos_filas_total":           ("counter", "Filas del árbol recorridas."),
+    "anexos_registros_total":       ("counter", "Filas que entraron a cada anexo."),
+    "anexos_sitios_total":          ("counter", "Archivos por sitio escritos por anexo."),
+    "anexos_bytes_total":           ("counter", "Bytes de .xlsx producidos."),
+    "anexos_peticion_segundos":     ("summary", "Segundos por petición HTTP, incluido el envío."),
+    "anexos_respuesta_bytes_total": ("counter", "Bytes enviados en respuestas de ZIP."),
+    "anexos_cache":                 ("gauge",   "Estado de la caché de ZIP."),
+    "anexos_trabajos":              ("gauge",   "Trabajos en segundo plano por estado."),
+    "anexos_proceso":               ("gauge",   "Proceso que respondió (1, con su pid)."),
+}
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in sorted(labels.items())) + "}"
+
+
+class Metricas:
+    """Contadores y medidores por proceso, seguros entre hilos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._muestras = {fam: {} for fam in FAMILIAS}
+
+    def sumar(self, familia, valor=1, sufijo="", **labels):
+        key = (sufijo, _labels(labels))
+        with self._lock:
+            muestras = self._muestras[familia]
+            muestras[key] = muestras.get(key, 0) + valor
+
+    def fijar(self, familia, valor, sufijo="", **labels):
+        with self._lock:
+            self._muestras[familia][(sufijo, _labels(labels))] = valor
+
+    def observar(self, familia, segundos, **labels):
+        """Una observación de un summary (suma y cantidad)."""
+        self.sumar(familia, segundos, "_sum", **labels)
+        self.sumar(familia, 1, "_count", **labels)
+
+    def registrar_ejecucion(self, progress, error=None):
+        """Acumula los contadores de una ejecución terminada (o fallida)."""
+        self.sumar("anexos_ejecuciones_total", resultado="error" if error else "ok")
+        if progress is None:
+            return
+        for nombre, segundos in progress["fases"].items():
+            self.observar("anexos_fase_segundos", segundos, fase=nombre)
+        for nombre, pico in progress["memoria_pico"].items():
+            self.fijar("anexos_memoria_pico_bytes", pico, fase=nombre)
+        self.sumar("anexos_filas_total", progress["filas"])
+        for num, n in progress["registros"].items():
+            self.sumar("anexos_registros_total", n, anexo=num)
+        for num, n in progress["sitios"].items():
+            self.sumar("anexos_sitios_total", n, anexo=num)
+        self.sumar("anexos_bytes_total", progress["bytes"])
+
+    def exponer(self):
+        """Texto en el formato de exposición de Prometheus."""
+        lineas = []
+        with self._lock:
+            for familia, (tipo, ayuda) in FAMILIAS.items():
+                muestras = self._muestras[familia]
+                if not muestras:
+                    continue
+                lineas.append(f"# HELP {familia} {ayuda}")
+                lineas.append(f"# TYPE {familia} {tipo}")
+                for (sufijo, labels), valor in sorted(muestras.items()):
+                    texto = str(valor) if isinstance(valor, int) else repr(round(valor, 6))
+                    lineas.append(f"{familia}{sufijo}{labels} {texto}")
+        return "\n".join(lineas) + "\n"
+
+
+METRICAS = Metricas()
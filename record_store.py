@@ -0,0 +1,155 @@
+# record_store.py
+"""
+Almacén en disco (SQLite) de las filas clasificadas.
+
+En vez de juntar en memoria todas las filas que entran a cada anexo y luego
+separarlas por sitio, la clasificación las va agregando aquí con su anexo,
+sitio y correlativo, y la escritura lee un sitio a la vez. La memoria queda
+acotada a un lote de inserciones más la tabla de un sitio, sin importar
+cuántas filas entren.
+"""
+import os
+import pickle
+import sqlite3
+import tempfile
+
+LOTE = 5000
+
+
+def _valor_sitio(sitio):
+    """Valor con que se guarda un sitio: SQLite solo acepta texto y números."""
+    return sitio if isinstance(sitio, (str, int, float)) else str(sitio)
+
+
+class SpillStore:
+    """
+    Filas (tuplas) por anexo y sitio en un archivo SQLite. Sin `path` se usa
+    un archivo temporal que se borra en `close`.
+    """
+
+    def __init__(self, path=None, directorio=None):
+        self.temporal = path is None
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix="anexos_", suffix=".sqlite", dir=directorio)
+            os.close(fd)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            PRAGMA journal_mode = OFF;
+            PRAGMA synchronous  = OFF;
+            CREATE TABLE IF NOT EXISTS filas (
+                anexo INTEGER NOT NULL,
+                sitio,
+                seq   INTEGER NOT NULL,
+                fila  BLOB    NOT NULL
+            );
+        """)
+        self._lote = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def anexo(self, num, columnas, grupo):
+        """Destino de las filas del anexo `num` (ver `AnexoEnDisco`)."""
+        return AnexoEnDisco(self, num, columnas, columnas.index(grupo))
+
+    def _agregar(self, num, sitio, seq, fila):
+        self._lote.append((num, sitio, seq, pickle.dumps(fila, protocol=4)))
+        if len(self._lote) >= LOTE:
+            self._vaciar()
+
+    def _vaciar(self):
+        if self._lote:
+            self._conn.executemany("INSERT INTO filas VALUES (?, ?, ?, ?)", self._lote)
+            self._lote = []
+
+    def commit(self):
+        """Escribe lo pendiente e indexa por sitio: desde aquí se puede leer."""
+        self._vaciar()
+        self._conn.execute("CREATE INDEX IF NOT EXISTS por_sitio ON filas (anexo, sitio, seq)")
+        self._conn.commit()
+
+    def sitios(self, num):
+        """Sitios distintos del anexo `num`."""
+        cur = self._conn.execute("SELECT DISTINCT sitio FROM filas WHERE anexo = ?", (num,))
+        return [sitio for sitio, in cur]
+
+    def close(self):
+        self._conn.close()
+        if self.temporal and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def leer_filas(path, num, sitio):
+    """(correlativo, fila) de un sitio en orden de llegada, desde otra conexión."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        cur = conn.execute("SELECT seq, fila FROM filas WHERE anexo = ? AND sitio = ? ORDER BY seq",
+                           (num, sitio))
+        for seq, blob in cur:
+            yield seq, pickle.loads(blob)
+    finally:
+        conn.close()
+
+
+class AnexoEnDisco:
+    """
+    Equivalente en disco de `anexos_core.Registros` durante la clasificación:
+    recibe tuplas con `append` y las guarda bajo el sitio de la columna de
+    grupo. Las filas sin sitio no se guardan (no van a ningún archivo).
+    """
+    __slots__ = ("store", "num", "columnas", "key", "n")
+
+    def __init__(self, store, num, columnas, key):
+        self.store    = store
+        self.num      = num
+        self.columnas = columnas
+        self.key      = key
+        self.n        = 0
+
+    def append(self, fila):
+        self.n += 1
+        sitio = fila[self.key]
+        if sitio is None or sitio != sitio:   # vacío o NaN
+            return
+        self.store._agregar(self.num, _valor_sitio(sitio), self.n, fila)
+
+    def __len__(self):
+        return self.n
+
+    def tabla(self, sitio, numerar=None, quitar_grupo=False):
+        """Tabla de un sitio que se lee del disco recién al recorrerla."""
+        return TablaEnDisco(self.store.path, self.num, sitio, self.columnas, self.key,
+                            numerar, quitar_grupo)
+
+
+class TablaEnDisco:
+    """
+    Filas de un sitio guardadas en un `SpillStore`, con las mismas `columnas`
+    y forma que la tabla en memoria. Se puede enviar a otro proceso: solo
+    lleva la ruta del archivo y el sitio.
+    """
+
+    def __init__(self, path, num, sitio, columnas, key, numerar=None, quitar_grupo=False):
+        self.path    = path
+        self.num     = num
+        self.sitio   = sitio
+        self.key     = key
+        self.numerar = numerar
+        self.quitar  = quitar_grupo
+        columnas = list(columnas)
+        if quitar_grupo:
+            del columnas[key]
+        if numerar:
+            columnas.insert(0, numerar)
+        self.columnas = tuple(columnas)
+
+    def __iter__(self):
+        key = self.key
+        for seq, fila in leer_filas(self.path, self.num, self.sitio):
+            if self.quitar:
+                fila = fila[:key] + fila[key+1:]
+            yield (seq, *fila) if self.numerar else fila
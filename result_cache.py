@@ -0,0 +1,209 @@
+# result_cache.py
+"""
+Caché en disco de los ZIP generados, indexada por el contenido del archivo
+subido. Volver a subir el mismo Árbol de Equipos (misma hoja, misma versión
+del generador) devuelve el ZIP guardado sin recalcular nada.
+"""
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import uuid
+import zipfile
+
+from anexos_core import ANEXOS, GENERATOR_VERSION, iter_tree, run_all_anexos, zip_anexos
+from metrics import REPORT
+from zip_stream import iter_zip
+
+CHUNK = 1 << 20
+
+
+def _read_chunks(path):
+    with open(path, "rb") as fh:
+        while True:
+            chunk = fh.read(CHUNK)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _progreso_guardado(path, progress):
+    """
+    Marca `progress` como servido desde la caché y copia los contadores del
+    informe (`metrics.REPORT`) que viaja dentro del ZIP guardado.
+    """
+    if progress is None:
+        return
+    progress["cache"] = True
+    try:
+        with zipfile.ZipFile(path) as zf:
+            data = json.loads(zf.read(REPORT))
+    except (KeyError, ValueError, zipfile.BadZipFile):   # ZIP de antes del informe
+        return
+    progress["filas"] = data.get("filas", 0)
+    progress["bytes"] = data.get("bytes", 0)
+    for clave in ("registros", "sitios"):
+        for num, n in data.get(clave, {}).items():
+            progress[clave][int(num)] = n
+    progress["sitios_total"].update(progress["sitios"])
+
+
+class ResultCache:
+    """
+    ZIPs guardados como `<sha256>.zip` en `cache_dir`, con un tope total de
+    `max_bytes`. Cada acierto actualiza la fecha del archivo, y al pasarse
+    del tope se borran primero los menos usados (LRU).
+    """
+
+    def __init__(self, cache_dir, max_bytes=1 << 30):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits   = 0
+        self.misses = 0
+        self._lock  = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # ── claves ──────────────────────────────────────────────────────────
+    @staticmethod
+    def _hasher(hoja, anexos=None, sitios=None, salida="xlsx"):
+        h = hashlib.sha256()
+        h.update(f"{GENERATOR_VERSION}\0{hoja or ''}\0".encode("utf-8"))
+        if anexos is not None or sitios is not None:
+            # Una selección parcial es otro resultado; sin selección la clave no cambia
+            seleccion = (sorted(anexos) if anexos is not None else None,
+                         sorted(sitios) if sitios is not None else None)
+            h.update(f"{seleccion!r}\0".encode("utf-8"))
+        if salida not in (None, "xlsx"):
+            h.update(f"salida={salida}\0".encode("utf-8"))
+        return h
+
+    def key(self, data, hoja=None, anexos=None, sitios=None, salida="xlsx"):
+        """Clave de unos bytes ya en memoria."""
+        h = self._hasher(hoja, anexos, sitios, salida)
+        h.update(data)
+        return h.hexdigest()
+
+    def key_for_file(self, path, hoja=None, anexos=None, sitios=None, salida="xlsx"):
+        """Clave de un archivo en disco, leído por bloques."""
+        h = self._hasher(hoja, anexos, sitios, salida)
+        for chunk in _read_chunks(path):
+            h.update(chunk)
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.zip")
+
+    # ── lectura / escritura ─────────────────────────────────────────────
+    def get(self, key):
+        """Ruta del ZIP guardado para `key`, o None. Cuenta aciertos y fallos."""
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def _part(self, key):
+        return f"{self._path(key)}.{uuid.uuid4().hex}.part"
+
+    def _publish(self, part, key):
+        """Mueve un ZIP terminado a su lugar definitivo y aplica el tope de tamaño."""
+        os.replace(part, self._path(key))
+        self.evict()
+
+    def tee(self, key, chunks):
+        """
+        Deja pasar los bytes de `chunks` y a la vez los guarda bajo `key`.
+        Solo se publica en la caché si el iterador se consume completo.
+        """
+        part = self._part(key)
+        try:
+            with open(part, "wb") as fh:
+                for chunk in chunks:
+                    fh.write(chunk)
+                    yield chunk
+        except BaseException:
+            os.remove(part)
+            raise
+        self._publish(part, key)
+
+    def evict(self):
+        """Borra los ZIP menos usados hasta quedar bajo `max_bytes`."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".zip"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def stats(self):
+        """Aciertos, fallos, entradas y bytes ocupados."""
+        sizes = [os.path.getsize(os.path.join(self.cache_dir, n))
+                 for n in os.listdir(self.cache_dir) if n.endswith(".zip")]
+        return {"hits": self.hits, "misses": self.misses,
+                "entradas": len(sizes), "bytes": sum(sizes)}
+
+    # ── envoltorios de los anexos ───────────────────────────────────────
+    def zip_chunks(self, data, hoja=None, workers=1, progress=None, anexos=None, sitios=None,
+                   salida="xlsx", directorio=None):
+        """
+        Como `zip_anexos` sobre unos bytes en memoria, pero servido desde la
+        caché cuando ya se generó antes. `directorio` es la carpeta de trabajo
+        de `zip_anexos`.
+        """
+        key  = self.key(data, hoja, anexos, sitios, salida)
+        path = self.get(key)
+        if path is not None:
+            _progreso_guardado(path, progress)
+            return _read_chunks(path)
+        return self.tee(key, zip_anexos(io.BytesIO(data), workers, progress, hoja,
+                                        anexos=anexos, sitios=sitios, salida=salida,
+                                        directorio=directorio))
+
+    def run_all_anexos(self, file_path, root_out, hoja=None, workers=1, progress=None,
+                       reuse_from=None, anexos=None, sitios=None, salida="xlsx"):
+        """
+        Como `anexos_core.run_all_anexos`, pero reutilizando el ZIP guardado
+        si el archivo ya se procesó: se descomprime en `root_out`. Si no, se
+        genera en disco (aprovechando `reuse_from`) y se guarda su ZIP.
+        """
+        key  = self.key_for_file(file_path, hoja, anexos, sitios, salida)
+        path = self.get(key)
+        if path is not None:
+            _progreso_guardado(path, progress)
+            for subdir_name, _ in ANEXOS:
+                os.makedirs(os.path.join(root_out, subdir_name), exist_ok=True)
+            with zipfile.ZipFile(path) as zf:
+                zf.extractall(root_out)
+            return
+        run_all_anexos(file_path, root_out, workers, progress, hoja, reuse_from,
+                       anexos=anexos, sitios=sitios, salida=salida)
+        for _ in self.tee(key, iter_zip(iter_tree(root_out))):
+            pass
+
+
+def default_cache():
+    """Caché configurada por ANEXOS_CACHE_DIR / ANEXOS_CACHE_MAX_MB."""
+    cache_dir = os.environ.get("ANEXOS_CACHE_DIR",
+                               os.path.join(tempfile.gettempdir(), "anexos_cache"))
+    max_mb = int(os.environ.get("ANEXOS_CACHE_MAX_MB", "1024"))
+    return ResultCache(cache_dir, max_bytes=max_mb << 20)
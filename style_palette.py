@@ -0,0 +1,149 @@
+# style_palette.py
+"""
+Colores de fuente y relleno por estilo de celda, resueltos una sola vez.
+
+Un libro tiene pocas decenas de estilos distintos (los `xf` de styles.xml), así
+que en vez de mirar el color de cada celda se resuelve cada estilo a un ARGB
+canónico —aplicando el tema, la paleta indexada y el tinte— y los filtros de
+color se convierten en conjuntos de ids de estilo. Clasificar una celda queda
+en `style_id in ids`.
+"""
+import colorsys
+import xml.etree.ElementTree as ET
+
+DRAWING_NS = "http://schemas.openxmlformats.org/drawingml/2006/main"
+
+# Orden de los colores del tema en el XML (clrScheme)
+_SCHEME = ("dk1", "lt1", "dk2", "lt2", "accent1", "accent2", "accent3",
+           "accent4", "accent5", "accent6", "hlink", "folHlink")
+
+
+def theme_colors(theme_xml):
+    """
+    Lista de RGB (6 hex) del tema en el orden en que los referencia
+    `<color theme="n"/>`: Excel invierte los pares claro/oscuro (0 = lt1,
+    1 = dk1, 2 = lt2, 3 = dk2).
+    """
+    if not theme_xml:
+        return []
+    root = ET.fromstring(theme_xml)
+    scheme = root.find(f".//{{{DRAWING_NS}}}clrScheme")
+    if scheme is None:
+        return []
+    by_name = {}
+    for child in scheme:
+        name = child.tag.rsplit("}", 1)[-1]
+        clr = next(iter(child), None)
+        if clr is None:
+            continue
+        by_name[name] = (clr.get("val") if clr.tag.endswith("srgbClr")
+                         else clr.get("lastClr", "")).upper()
+    colors = [by_name.get(name, "") for name in _SCHEME]
+    colors[0], colors[1], colors[2], colors[3] = colors[1], colors[0], colors[3], colors[2]
+    return colors
+
+
+def default_indexed():
+    """Paleta indexada por defecto de Excel (ARGB)."""
+    from openpyxl.styles.colors import COLOR_INDEX
+    return list(COLOR_INDEX)
+
+
+def apply_tint(rgb, tint):
+    """Aplica el tinte de Excel (luminosidad HLS) a un RGB de 6 hex."""
+    if not tint:
+        return rgb
+    r, g, b = (int(rgb[i:i+2], 16) / 255 for i in (0, 2, 4))
+    h, l, s = colorsys.rgb_to_hls(r, g, b)
+    l = l * (1 + tint) if tint < 0 else l * (1 - tint) + tint
+    r, g, b = colorsys.hls_to_rgb(h, l, s)
+    return "".join(f"{round(c * 255):02X}" for c in (r, g, b))
+
+
+def resolve_color(rgb=None, theme=None, indexed=None, tint=0.0, themes=(), palette=()):
+    """
+    ARGB canónico (8 hex, mayúsculas) de un color de SpreadsheetML, o '' si
+    no tiene color propio (automático / sin definir). Los RGB explícitos se
+    respetan tal cual; los de tema e índice salen opacos (alfa FF).
+    """
+    tint = float(tint or 0)
+    if rgb:
+        rgb = str(rgb).upper()
+        if len(rgb) == 6:
+            rgb = "FF" + rgb
+        if tint:
+            rgb = rgb[:2] + apply_tint(rgb[2:], tint)
+        return rgb
+    if theme is not None:
+        theme = int(theme)
+        if theme < len(themes) and themes[theme]:
+            return "FF" + apply_tint(themes[theme], tint)
+        return ""
+    if indexed is not None:
+        indexed = int(indexed)
+        if indexed < len(palette):
+            return "FF" + apply_tint(palette[indexed][-6:], tint)
+        if indexed == 64:   # primer plano del sistema
+            return "FF000000"
+        if indexed == 65:   # fondo del sistema
+            return "FFFFFFFF"
+    return ""
+
+
+def _matches(argb, modo, rgb):
+    if modo == "contiene":
+        return rgb in argb
+    if modo == "termina":
+        return argb.endswith(rgb)
+    raise ValueError(f"Modo de color desconocido: {modo}")
+
+
+class StylePalette:
+    """
+    ARGB de fuente y de relleno sólido por id de estilo, con los conjuntos de
+    ids que cumplen cada condición de color calculados una sola vez.
+    """
+
+    def __init__(self, font_argb, fill_argb):
+        self.font_argb = font_argb
+        self.fill_argb = fill_argb
+        self._ids = {}
+
+    def font_ids(self, modo, rgb):
+        """Ids de estilo cuya fuente cumple (`modo`, `rgb`)."""
+        return self._select("fuente", self.font_argb, modo, rgb)
+
+    def fill_ids(self, modo, rgb):
+        """Ids de estilo cuyo relleno sólido cumple (`modo`, `rgb`)."""
+        return self._select("relleno", self.fill_argb, modo, rgb)
+
+    def _select(self, kind, argbs, modo, rgb):
+        key = (kind, modo, rgb)
+        ids = self._ids.get(key)
+        if ids is None:
+            ids = self._ids[key] = frozenset(
+                i for i, argb in enumerate(argbs) if argb and _matches(argb, modo, rgb))
+        return ids
+
+
+def palette_from_openpyxl(wb):
+    """`StylePalette` de un libro ya cargado con openpyxl (ids = `cell.style_id`)."""
+    themes  = theme_colors(wb.loaded_theme)
+    indexed = list(getattr(wb, "_colors", None) or default_indexed())
+
+    def argb(color):
+        if color is None or color.type == "auto":
+            return ""
+        return resolve_color(rgb=color.rgb if color.type == "rgb" else None,
+                             theme=color.theme if color.type == "theme" else None,
+                             indexed=color.indexed if color.type == "indexed" else None,
+                             tint=color.tint, themes=themes, palette=indexed)
+
+    fonts, fills = [], []
+    for style in wb._cell_styles:
+        font = wb._fonts[style.fontId]
+        fill = wb._fills[style.fillId]
+        fonts.append(argb(font.color))
+        solid = getattr(fill, "patternType", None) == "solid"
+        fills.append(argb(fill.fgColor) if solid else "")
+    return StylePalette(fonts, fills)
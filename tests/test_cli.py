@@ -0,0 +1,18 @@
+# tests/test_cli.py
+"""Carpetas de salida de los lotes: una por archivo de entrada."""
+import os
+
+from anexos_cli import output_roots
+
+
+def test_mismo_nombre_en_carpetas_distintas():
+    paths = [os.path.join("m1", "arbol.xlsx"), os.path.join("m2", "arbol.xlsx"),
+             os.path.join("m3", "arbol.b.xlsx"), os.path.join("m3", "arbol_b.xlsx")]
+    roots = output_roots(paths, "out")
+    assert [os.path.basename(roots[p]) for p in paths] == [
+        "Anexos_arbol", "Anexos_arbol_1", "Anexos_arbol_b", "Anexos_arbol_b_1"]
+
+    # Junto a cada archivo no chocan: cada uno queda en su carpeta
+    roots = output_roots(paths[:2])
+    assert roots[paths[0]] != roots[paths[1]]
+    assert all(os.path.basename(r) == "Anexos_arbol" for r in roots.values())
@@ -0,0 +1,156 @@
+# tests/test_render.py
+"""
+Regenerar sobre una carpeta anterior (`reuse_from`) con una selección de
+anexos o sitios: lo que queda fuera de la selección se conserva tal cual y
+nunca se pisa el archivo de otro sitio.
+"""
+import json
+import os
+
+import openpyxl
+import pytest
+from openpyxl.styles import Font
+
+from anexos_core import (
+    MANIFEST, EXT_CARGA, read_manifest, read_manifest_sitios, run_all_anexos,
+)
+from anexos_specs import GREEN, RED, SPEC_BY_NUM
+
+ENCABEZADO = [
+    "CAMPO DE CLASIFICACION", "NIVEL5", "NIVEL6", "NIVEL7", "NIVEL8", "DENOMINACION",
+    "TIPO DE EQUIPO", "TP.OBJETO TECNICO", "UBICACION TECNICA SUPERIOR", "COD SAP",
+    "CENTRO EMPLAZ", "SOCIEDAD", "CENTRO COSTE", "CENTRO PLANIF",
+]
+
+
+def _libro(path, sitios, sufijo="", verde=False):
+    """
+    Por sitio, una fila del Anexo 8 (NO QR) y una del 11 (NIVEL8 en rojo);
+    con `verde`, también una del 9 (NIVEL8 en verde).
+    """
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(ENCABEZADO)
+    for i, sitio in enumerate(sitios):
+        ws.append([sitio, "UT", "UT-A", "NO QR", f"EQ{i}", f"Equipo {i}{sufijo}",
+                   "BOMBA", "EQ", "UT", i, "C1", "S1", "CC", "P1"])
+        ws.append([sitio, "UT", "UT-A", "UT-A-1", f"EQ{i}R", f"Baja {i}{sufijo}",
+                   "BOMBA", "EQ", "UT", i, "C1", "S1", "CC", "P1"])
+        ws.cell(ws.max_row, 5).font = Font(color="FF" + RED)
+        if verde:
+            ws.append([sitio, "UT", "UT-A", "UT-A-2", f"EQ{i}V", f"Alta {i}{sufijo}",
+                       "BOMBA", "EQ", "UT", i, "C1", "S1", "CC", "P1"])
+            ws.cell(ws.max_row, 5).font = Font(color=GREEN)
+    wb.save(path)
+    return str(path)
+
+
+def _leer(root):
+    """{"subcarpeta/archivo": bytes} de lo que figura en el manifiesto de `root`."""
+    out = {}
+    for rel in read_manifest(root):
+        with open(os.path.join(root, *rel.split("/")), "rb") as fh:
+            out[rel] = fh.read()
+    return out
+
+
+def _archivos(root):
+    return {f"{carpeta}/{f}" for carpeta in os.listdir(root)
+            if os.path.isdir(os.path.join(root, carpeta))
+            for f in os.listdir(os.path.join(root, carpeta))}
+
+
+def test_sitios_con_el_mismo_nombre_seguro(tmp_path):
+    root = str(tmp_path / "out")
+    run_all_anexos(_libro(tmp_path / "a.xlsx", ["A/B", "A_B"]), root)
+    antes = _leer(root)
+    assert sorted(read_manifest_sitios(root).values()) == ["A/B", "A/B", "A_B", "A_B"]
+
+    run_all_anexos(_libro(tmp_path / "b.xlsx", ["A/B", "A_B"], sufijo=" v2"), root,
+                   reuse_from=root, sitios=["A_B"])
+    sitios = read_manifest_sitios(root)
+    despues = _leer(root)
+    assert sorted(sitios.values()) == ["A/B", "A/B", "A_B", "A_B"]
+    for rel, sitio in sitios.items():
+        if sitio == "A/B":
+            assert despues[rel] == antes[rel]
+        else:
+            assert despues[rel] != antes[rel]
+    assert _archivos(root) == set(sitios)
+
+
+def test_no_pisa_archivos_de_otro_sitio(tmp_path):
+    root = str(tmp_path / "out")
+    run_all_anexos(_libro(tmp_path / "a.xlsx", ["Norte"]), root)
+    # Un manifiesto que atribuye el archivo de "Norte" a otro sitio
+    path = os.path.join(root, MANIFEST)
+    with open(path, encoding="utf-8") as fh:
+        data = json.load(fh)
+    data["sitios"] = dict.fromkeys(data["sitios"], "Sur")
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(data, fh)
+
+    with pytest.raises(ValueError, match="fuera de la selección"):
+        run_all_anexos(_libro(tmp_path / "b.xlsx", ["Norte"], sufijo=" v2"), root,
+                       reuse_from=root, sitios=["Norte"])
+
+
+def test_seleccion_conserva_el_resto(tmp_path):
+    root = str(tmp_path / "out")
+    run_all_anexos(_libro(tmp_path / "a.xlsx", ["Norte", "Sur", "Este"]), root)
+    antes = _leer(root)
+    huellas = read_manifest(root)
+
+    # "Este" desapareció del árbol: solo se regenera "Norte" y se borra "Este"
+    run_all_anexos(_libro(tmp_path / "b.xlsx", ["Norte", "Sur"], sufijo=" v2"), root,
+                   reuse_from=root, sitios=["Norte", "Este"])
+    sitios = read_manifest_sitios(root)
+    despues = _leer(root)
+    assert sorted(set(sitios.values())) == ["Norte", "Sur"]
+    assert _archivos(root) == set(sitios)
+    for rel, sitio in sitios.items():
+        assert (despues[rel] == antes[rel]) == (sitio == "Sur")
+
+    # Solo el Anexo 8, hacia otra carpeta: el Anexo 11 se copia de la anterior
+    otra = str(tmp_path / "otra")
+    run_all_anexos(_libro(tmp_path / "c.xlsx", ["Norte", "Sur"], sufijo=" v3"), otra,
+                   reuse_from=root, anexos=[8])
+    nuevas = read_manifest(otra)
+    assert set(nuevas) == set(sitios)
+    for rel in nuevas:
+        if rel.startswith("Anexo11"):
+            assert nuevas[rel] == read_manifest(root)[rel]
+            with open(os.path.join(otra, *rel.split("/")), "rb") as fh:
+                assert fh.read() == despues[rel]
+        else:
+            assert nuevas[rel] != huellas.get(rel)
+
+
+def _encabezados(root, carpeta):
+    """Primera línea de cada archivo de carga de `carpeta`."""
+    out = []
+    for f in sorted(os.listdir(os.path.join(root, carpeta))):
+        with open(os.path.join(root, carpeta, f), encoding="utf-8") as fh:
+            out.append(fh.readline().rstrip("\r\n").split("\t"))
+    return out
+
+
+def test_carga_con_columnas_del_spec(tmp_path):
+    libro = _libro(tmp_path / "a.xlsx", ["Norte", "Sur"], verde=True)
+    run_all_anexos(libro, str(tmp_path / "carga"), salida="carga")
+    run_all_anexos(libro, str(tmp_path / "unica"), salida="carga_unica")
+    assert sorted(os.listdir(tmp_path / "unica" / "Anexo9_Incorp")) == ["Anexo9" + EXT_CARGA]
+
+    # Anexo 9: la columna de grupo (Campo de clasificación) va donde la pone
+    # `carga`, igual en los dos modos
+    spec = SPEC_BY_NUM[9]
+    por_sitio = _encabezados(tmp_path / "carga", spec["carpeta"])
+    assert len(por_sitio) == 2
+    assert "Campo de clasificación" in por_sitio[0]
+    assert por_sitio[0] == [c for c in spec["carga"] if c in por_sitio[0]]
+    assert _encabezados(tmp_path / "unica", spec["carpeta"]) == por_sitio[:1]
+
+    # Anexo 8: `carga` no trae el sitio; el archivo único lo agrega primero
+    spec = SPEC_BY_NUM[8]
+    assert _encabezados(tmp_path / "carga", spec["carpeta"])[0] == spec["carga"]
+    assert _encabezados(tmp_path / "unica", spec["carpeta"]) == [["Sitio", *spec["carga"]]]
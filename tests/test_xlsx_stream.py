@@ -0,0 +1,123 @@
+# tests/test_xlsx_stream.py
+"""
+El lector en streaming (`XlsxReader` + `StylePalette`) tiene que leer y
+clasificar igual que el camino de openpyxl (`palette_from_openpyxl` +
+`scan_anexos`): colores de tema, indexados, con tinte y RGB, en fuentes y
+rellenos, y celdas de string compartido, texto enriquecido en línea, fecha,
+booleano y vacías.
+"""
+import datetime
+
+import openpyxl
+import pytest
+from openpyxl.cell.rich_text import CellRichText, TextBlock
+from openpyxl.cell.text import InlineFont
+from openpyxl.styles import Font, PatternFill
+from openpyxl.styles.colors import Color
+from openpyxl.writer.theme import theme_xml
+
+from anexos_core import detect_header, normalize, open_sheet, scan_anexos, scan_rows
+from anexos_specs import GREEN
+from xlsx_stream import XlsxReader
+
+HOJA = "Arbol"
+
+ENCABEZADO = [
+    "CAMPO DE CLASIFICACION", "NIVEL5", "NIVEL6", "NIVEL7", "NIVEL8", "DENOMINACION",
+    "TIPO DE EQUIPO", "TP.OBJETO TECNICO", "UBICACION TECNICA SUPERIOR", "COD SAP",
+    "CENTRO EMPLAZ", "SOCIEDAD", "CENTRO COSTE", "CENTRO PLANIF",
+    "AÑO DE CONSTRUCCION", "NUMERO DE INVENTARIO",
+]
+N5, N6, N7, N8, DENOM, ANO, INVENT = 1, 2, 3, 4, 5, 14, 15
+
+# Tema con accent6 (theme="9") en el verde de los anexos
+TEMA = theme_xml.replace('<a:srgbClr val="F79646"/>', f'<a:srgbClr val="{GREEN[2:]}"/>')
+
+FUENTES = [
+    Color(rgb=GREEN),                    # verde RGB            → Anexo 9
+    Color(theme=9),                      # verde del tema       → Anexo 9
+    Color(theme=9, tint=0.4),            # tema aclarado: nada
+    Color(indexed=10),                   # rojo indexado        → Anexo 11
+    Color(indexed=13),                   # amarillo indexado    → Anexo 10
+    Color(rgb="FFFFFF00"),               # amarillo RGB         → Anexo 10
+    Color(rgb="FFFF0000", tint=-0.25),   # rojo oscurecido: nada
+    Color(theme=1),                      # texto del tema: nada
+    None,                                # sin color
+]
+
+RELLENOS = [
+    (N6, PatternFill("solid", fgColor=GREEN)),                          # → Anexo 12
+    (N5, PatternFill("solid", fgColor=Color(theme=9))),                 # → Anexo 12
+    (N7, PatternFill("solid", fgColor=Color(theme=9, tint=-0.5))),      # nada
+    (N6, PatternFill("gray125", fgColor=GREEN)),                        # no sólido: nada
+    (N7, PatternFill("solid", fgColor=Color(indexed=17))),              # nada
+]
+
+
+def _libro(path):
+    wb = openpyxl.Workbook()
+    wb.loaded_theme = TEMA
+    ws = wb.active
+    ws.title = HOJA
+    ws.append(["Árbol de equipos"])
+    ws.append(ENCABEZADO)
+    for i in range(len(FUENTES) * 2):
+        sitio = ("Estación Norte", "ESTACION SUR", None)[i % 3]
+        fila = [sitio, f"UT-{i}", f"UT-{i}-A", "NO QR" if i % 4 == 0 else f"UT-{i}-A-1",
+                f"EQ{i:03d}", f"Equipo {i}", "BOMBA", "EQ", "UT", 1000 + i,
+                "C1", "S1", None, "P1", None, None]
+        if i % 3 == 1:
+            fila[DENOM] = CellRichText([TextBlock(InlineFont(b=True), "Bomba "), f"principal {i}"])
+        if i % 2 == 0:
+            fila[ANO] = datetime.datetime(2000 + i, 1 + i % 12, 1)
+            fila[INVENT] = i % 4 == 0
+        ws.append(fila)
+        r = ws.max_row
+        color = FUENTES[i % len(FUENTES)]
+        if color is not None:
+            ws.cell(r, N8 + 1).font = Font(color=color)
+        col, relleno = RELLENOS[i % len(RELLENOS)]
+        ws.cell(r, col + 1).fill = relleno
+        if i % 5 == 4:
+            ws.append([])   # fila vacía intermedia
+    ws.cell(ws.max_row + 2, 1, "Estación Norte")   # fila casi vacía al final
+    wb.save(path)
+
+
+@pytest.fixture
+def libro(tmp_path):
+    path = tmp_path / "arbol.xlsx"
+    _libro(path)
+    return path
+
+
+def _tablas(registros):
+    return {num: (regs.columnas, [list(fila) for fila in regs]) for num, regs in registros.items()}
+
+
+def test_valores_como_openpyxl(libro):
+    ws = openpyxl.load_workbook(libro)[HOJA]
+    esperado = [list(fila) for fila in ws.iter_rows(values_only=True)]
+    with XlsxReader(str(libro)) as book:
+        leido = [vals for vals, _ in book.iter_rows(HOJA, width=ws.max_column)]
+    assert leido == esperado
+    assert any(isinstance(v, datetime.datetime) for fila in leido for v in fila)
+    assert any(v is True for fila in leido for v in fila)
+    assert "Bomba principal 1" in leido[3]
+
+
+def test_clasifica_como_openpyxl(libro):
+    ws = openpyxl.load_workbook(libro)[HOJA]
+    header_row = detect_header(ws)
+    norm_hdr = [normalize(c.value) for c in ws[header_row]]
+    esperado = _tablas(scan_anexos(ws, header_row, norm_hdr))
+
+    with XlsxReader(str(libro)) as book:
+        hdr, rows = open_sheet(book, HOJA)
+        leido = _tablas(scan_rows(rows, hdr, palette=book.palette))
+
+    assert hdr == norm_hdr
+    assert leido == esperado
+    # Cada filtro encontró filas: la comparación no pasa por estar todo vacío
+    assert {num: len(filas) for num, (_, filas) in leido.items()} == {
+        8: 5, 9: 4, 10: 4, 11: 2, 12: 8}
@@ -0,0 +1,324 @@
+# xlsx_stream.py
+"""
+Lector de .xlsx en streaming que conserva los colores de cada celda.
+
+openpyxl en modo read_only no expone fuentes ni rellenos, y el modo normal
+construye todo el libro en memoria. Aquí se recorre el XML de la hoja fila a
+fila y de cada celda se conserva solo su índice de estilo; los colores de cada
+estilo se resuelven una vez contra `styles.xml` y el tema. La memoria queda
+acotada a una fila (más la tabla de strings compartidos).
+"""
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+from xml.parsers import expat
+
+from style_palette import StylePalette, default_indexed, resolve_color, theme_colors
+
+# Los ayudantes de openpyxl se importan al usarse: abrir el módulo es gratis
+
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+CHUNK  = 1 << 16
+
+
+def _local(tag):
+    """Nombre del tag sin namespace."""
+    return tag.rsplit("}", 1)[-1]
+
+
+def _argb(elem, themes, palette):
+    """ARGB canónico de un elemento <color>/<fgColor> ('' si no tiene color)."""
+    if elem is None or elem.get("auto") in ("1", "true"):
+        return ""
+    return resolve_color(elem.get("rgb"), elem.get("theme"), elem.get("indexed"),
+                         elem.get("tint"), themes, palette)
+
+
+def _cast_number(value):
+    """Igual que openpyxl: entero salvo que el texto tenga decimales o exponente."""
+    if "." in value or "E" in value or "e" in value:
+        return float(value)
+    return int(value)
+
+
+class XlsxReader:
+    """
+    Abre un .xlsx (ruta o archivo binario) y permite recorrer sus hojas como
+    filas (valores, ids de estilo). Los colores de cada estilo se consultan en
+    `palette` (ver `style_palette.StylePalette`).
+    """
+
+    def __init__(self, source):
+        self.zf = zipfile.ZipFile(source)
+        self._wb_path = self._main_part()
+        self._sheets, self.epoch = self._read_workbook()
+        self._styles = None
+        self._strings = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.zf.close()
+
+    @property
+    def sheetnames(self):
+        return [name for name, _ in self._sheets]
+
+    # ── partes del paquete ──────────────────────────────────────────────
+    def _rels(self, part):
+        """Devuelve {rId: (tipo, ruta absoluta)} de las relaciones de `part`."""
+        folder, name = posixpath.split(part)
+        rels_path = posixpath.join(folder, "_rels", name + ".rels")
+        try:
+            root = ET.fromstring(self.zf.read(rels_path))
+        except KeyError:
+            return {}
+        rels = {}
+        for rel in root:
+            target = rel.get("Target", "")
+            if target.startswith("/"):
+                path = target.lstrip("/")
+            else:
+                path = posixpath.normpath(posixpath.join(folder, target))
+            rels[rel.get("Id")] = (rel.get("Type", ""), path)
+        return rels
+
+    def _main_part(self):
+        for typ, path in self._rels("").values():
+            if typ.endswith("/officeDocument"):
+                return path
+        return "xl/workbook.xml"
+
+    def _read_workbook(self):
+        from openpyxl.utils.datetime import CALENDAR_MAC_1904, WINDOWS_EPOCH
+        root = ET.fromstring(self.zf.read(self._wb_path))
+        rels = self._rels(self._wb_path)
+        epoch = WINDOWS_EPOCH
+        sheets = []
+        for elem in root.iter():
+            tag = _local(elem.tag)
+            if tag == "workbookPr" and elem.get("date1904") in ("1", "true"):
+                epoch = CALENDAR_MAC_1904
+            elif tag == "sheet":
+                rid = elem.get("{%s}id" % REL_NS)
+                sheets.append((elem.get("name"), rels[rid][1]))
+        return sheets, epoch
+
+    def _part_of_type(self, suffix):
+        for typ, path in self._rels(self._wb_path).values():
+            if typ.endswith(suffix) and path in self.zf.namelist():
+                return path
+        return None
+
+    @property
+    def shared_strings(self):
+        if self._strings is None:
+            path = self._part_of_type("/sharedStrings")
+            if path is None:
+                self._strings = []
+            else:
+                from openpyxl.reader.strings import read_string_table
+                with self.zf.open(path) as fh:
+                    self._strings = read_string_table(fh)
+        return self._strings
+
+    @property
+    def styles(self):
+        """
+        Datos de los estilos, indexados por el atributo `s` de cada celda:
+        (paleta de colores, estilos fecha, estilos duración).
+        """
+        if self._styles is None:
+            self._styles = self._read_styles()
+        return self._styles
+
+    @property
+    def palette(self):
+        """`StylePalette` del libro: ARGB de fuente y relleno de cada estilo."""
+        return self.styles[0]
+
+    def _theme_colors(self):
+        path = self._part_of_type("/theme")
+        return theme_colors(self.zf.read(path)) if path is not None else []
+
+    def _read_styles(self):
+        from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+        path = self._part_of_type("/styles")
+        if path is None:
+            return StylePalette([""], [""]), set(), set()
+        root = ET.fromstring(self.zf.read(path))
+        sections = {_local(child.tag): child for child in root}
+
+        num_fmts = dict(BUILTIN_FORMATS)
+        for nf in sections.get("numFmts", ()):
+            num_fmts[int(nf.get("numFmtId"))] = nf.get("formatCode")
+
+        themes  = self._theme_colors()
+        colors  = sections.get("colors")
+        custom  = [] if colors is None else [
+            c.get("rgb", "") for c in colors.iter() if _local(c.tag) == "rgbColor"]
+        indexed = custom or default_indexed()
+
+        fonts = []
+        for font in sections.get("fonts", ()):
+            color = next((c for c in font if _local(c.tag) == "color"), None)
+            fonts.append(_argb(color, themes, indexed))
+
+        fills = []
+        for fill in sections.get("fills", ()):
+            pattern = next((p for p in fill if _local(p.tag) == "patternFill"), None)
+            argb = ""
+            if pattern is not None and pattern.get("patternType") == "solid":
+                fg = next((c for c in pattern if _local(c.tag) == "fgColor"), None)
+                argb = _argb(fg, themes, indexed)
+            fills.append(argb)
+
+        xf_font, xf_fill, dates, timedeltas = [], [], set(), set()
+        for i, xf in enumerate(sections.get("cellXfs", ())):
+            font_id = int(xf.get("fontId", 0))
+            fill_id = int(xf.get("fillId", 0))
+            xf_font.append(fonts[font_id] if font_id < len(fonts) else "")
+            xf_fill.append(fills[fill_id] if fill_id < len(fills) else "")
+            fmt = num_fmts.get(int(xf.get("numFmtId", 0)))
+            if is_date_format(fmt):
+                dates.add(i)
+                if is_timedelta_format(fmt):
+                    timedeltas.add(i)
+        return StylePalette(xf_font or [""], xf_fill or [""]), dates, timedeltas
+
+    # ── filas ───────────────────────────────────────────────────────────
+    def iter_rows(self, sheet, min_row=1, max_row=None, width=0, columns=None):
+        """
+        Recorre la hoja `sheet` y produce una tupla (valores, estilos) por fila,
+        con las dos listas alineadas por columna y de largo al menos `width`.
+        Las filas vacías intermedias también se producen, así el número de
+        fila coincide con el de Excel.
+        Con `columns` (índices desde 0) solo se leen esas celdas; las demás
+        quedan en None, sin convertir su valor.
+
+        El XML se lee con expat y manejadores propios: no se arma ningún
+        elemento, y de las celdas que no interesan solo se mira la referencia.
+        """
+        from openpyxl.utils.cell import column_index_from_string
+        from openpyxl.utils.datetime import from_ISO8601, from_excel
+
+        path = dict(self._sheets)[sheet]
+        _, dates, timedeltas = self.styles
+        strings = self.shared_strings
+        epoch   = self.epoch
+
+        col_of = {}   # letras de columna → índice desde 0
+
+        def empty(n):
+            return [None] * n, [0] * n
+
+        def convert(text, s, t):
+            if t == "inlineStr":
+                return "".join(text) if text is not None else None
+            value = "".join(text) if text is not None else None
+            if not value:
+                return None
+            if t == "n":
+                value = _cast_number(value)
+                if s in dates:
+                    try:
+                        value = from_excel(value, epoch, timedelta=s in timedeltas)
+                    except (OverflowError, ValueError):
+                        value = "#VALUE!"
+            elif t == "s":
+                value = strings[int(value)]
+            elif t == "b":
+                value = bool(int(value))
+            elif t == "d":
+                value = from_ISO8601(value)
+            return value
+
+        ready    = []     # filas completas aún no entregadas
+        row      = None   # (valores, estilos) de la fila en curso; None = se salta
+        cell     = None   # (columna, estilo, tipo) de la celda en curso
+        text     = None   # trozos de texto de su <v> o <is>
+        capture  = False
+        col      = 0
+        next_row = 1
+        done     = False
+        names    = {}     # tags con namespace, fijados al ver la raíz
+
+        def start(name, attrs):
+            nonlocal row, cell, text, capture, col, next_row, done
+            if name == names.get("c"):
+                if row is None:
+                    return
+                ref = attrs.get("r")
+                if ref:
+                    letters = ref.rstrip("0123456789")
+                    col = col_of.get(letters)
+                    if col is None:
+                        col = col_of[letters] = column_index_from_string(letters) - 1
+                if columns is None or col in columns:
+                    cell = (col, int(attrs.get("s", 0)), attrs.get("t", "n"))
+                    text = None
+                col += 1
+            elif name == names.get("v") or name == names.get("is"):
+                if cell is not None:
+                    capture = True
+                    if text is None:
+                        text = []
+            elif name == names.get("row"):
+                if done:
+                    return
+                r = int(attrs.get("r", next_row))
+                if max_row is not None and r > max_row:
+                    done = True
+                    return
+                while next_row < r:
+                    if next_row >= min_row:
+                        ready.append(empty(width))
+                    next_row += 1
+                next_row = r + 1
+                row = empty(width) if r >= min_row else None
+                col = 0
+            elif not names:
+                ns = name[:name.index("}") + 1] if "}" in name else ""
+                names.update({tag: ns + tag for tag in ("c", "v", "is", "row")})
+
+        def end(name):
+            nonlocal row, cell, capture
+            if name == names["c"]:
+                if cell is None:
+                    return
+                c, s, t = cell
+                cell = None
+                values, styles = row
+                if c >= len(values):
+                    extra = c + 1 - len(values)
+                    values += [None] * extra; styles += [0] * extra
+                values[c] = convert(text, s, t)
+                styles[c] = s
+            elif name == names["v"] or name == names["is"]:
+                capture = False
+            elif name == names["row"] and row is not None:
+                ready.append(row)
+                row = None
+
+        def data(chunk):
+            if capture:
+                text.append(chunk)
+
+        parser = expat.ParserCreate(namespace_separator="}")
+        parser.buffer_text = True
+        parser.StartElementHandler  = start
+        parser.EndElementHandler    = end
+        parser.CharacterDataHandler = data
+
+        with self.zf.open(path) as fh:
+            while not done:
+                block = fh.read(CHUNK)
+                parser.Parse(block, not block)
+                yield from ready
+                ready.clear()
+                if not block:
+                    break
@@ -0,0 +1,67 @@
+# zip_stream.py
+"""
+ZIP en streaming: los bytes se entregan por trozos a medida que se agregan
+archivos, sin pasar por disco. Los .xlsx ya vienen comprimidos y se guardan
+tal cual (ZIP_STORED); el resto (archivos de carga, manifiesto, informe) es
+texto plano y se comprime (ZIP_DEFLATED).
+"""
+import time
+import zipfile
+
+from metrics import fase
+
+# Extensiones que ya vienen comprimidas: deflactarlas otra vez no achica nada
+SIN_COMPRIMIR = (".xlsx",)
+
+
+def compress_type(arcname):
+    """Compresión de una entrada según su extensión."""
+    if arcname.lower().endswith(SIN_COMPRIMIR):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+class _ChunkSink:
+    """Archivo de solo escritura, no posicionable, que acumula lo escrito."""
+
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_zip(entries, progress=None):
+    """
+    Recibe un iterable de (nombre dentro del zip, bytes) y produce los bytes
+    del ZIP resultante a medida que se consumen las entradas.
+    Con `progress` el tiempo de empaquetar (sin contar el de producir cada
+    entrada) se suma a la fase "zip".
+    """
+    sink = _ChunkSink()
+    zf = zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED)
+    for arcname, data in entries:
+        with fase(progress, "zip"):
+            info = zipfile.ZipInfo(arcname, time.localtime()[:6])
+            info.compress_type = compress_type(arcname)
+            info.external_attr = 0o644 << 16
+            zf.writestr(info, data)
+            chunk = sink.drain()
+        yield chunk
+    with fase(progress, "zip"):
+        zf.close()
+    yield sink.drain()